@@ -0,0 +1,113 @@
+import os
+import numpy as np
+from FileSignature import directory_signature
+
+# stores already loaded in this process, by gt directory
+_stores = {}
+
+def gt_name(gtFile):
+    # "gt.00.000948.txt" -> "00.000948"
+    return gtFile[3:-4]
+
+def gt_signature(pathGT):
+    # changes whenever a gt file is added, removed or edited
+    return directory_signature(pathGT, "gt.", ".txt")
+
+class AnnotationStore(object):
+    """
+    Annotations of every gt.<name>.txt file of a directory in columns
+
+    boxes: float array (n, 4) with tly, tlx, bry, brx of every annotation
+    codes: str array (n) with the signal type of every annotation
+    index: dictionary name -> (start, stop), rows of the annotations of
+           image <name>, in the same order as its gt file
+    """
+    def __init__(self, names, starts, stops, boxes, codes):
+        self.names = [str(name) for name in names]
+        self.boxes = boxes
+        self.codes = codes
+        self.index = dict(zip(self.names, zip(starts.tolist(), stops.tolist())))
+
+    @classmethod
+    def from_directory(cls, pathGT):
+        # parses every gt file once
+        names = []
+        starts = []
+        stops = []
+        rows = []
+        for gtFile in sorted(os.listdir(pathGT)):
+            if not (gtFile.startswith("gt.") and gtFile.endswith(".txt")):
+                continue
+            names.append(gt_name(gtFile))
+            starts.append(len(rows))
+            for line in open(os.path.join(pathGT, gtFile)).read().splitlines():
+                values = line.split()
+                if values:
+                    rows.append(values)
+            stops.append(len(rows))
+
+        boxes = np.array([[float(v) for v in values[:4]] for values in rows], dtype=float).reshape(-1, 4)
+        codes = np.array([values[4] for values in rows], dtype=str)
+        return cls(names, np.array(starts, dtype=int), np.array(stops, dtype=int), boxes, codes)
+
+    @classmethod
+    def from_npz(cls, pathNpz):
+        with np.load(pathNpz) as data:
+            return cls(data["names"], data["starts"], data["stops"], data["boxes"], data["codes"])
+
+    def save_npz(self, pathNpz, signature):
+        starts = np.array([self.index[name][0] for name in self.names], dtype=int)
+        stops = np.array([self.index[name][1] for name in self.names], dtype=int)
+        np.savez(pathNpz, names=np.array(self.names, dtype=str), starts=starts, stops=stops,
+                 boxes=self.boxes, codes=self.codes, signature=signature)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def get_boxes(self, name):
+        # (k, 4) array with the boxes of image <name>, empty if it has none
+        (start, stop) = self.index.get(name, (0, 0))
+        return self.boxes[start:stop]
+
+    def get(self, name):
+        # annotations of image <name> in the format of load_annotations:
+        # list of [tly, tlx, bry, brx, code]
+        (start, stop) = self.index.get(name, (0, 0))
+        return [box+[code] for box, code in zip(self.boxes[start:stop].tolist(), self.codes[start:stop].tolist())]
+
+def load_annotation_store(pathGT):
+    """
+    Annotation store of the gt directory pathGT
+
+    The store is compiled once into pathGT+".npz" (ex: datasets/train/gt.npz)
+    and rebuilt only when the gt files change. Inside a process the store is
+    loaded only once.
+    """
+    key = os.path.normpath(pathGT)
+    signature = gt_signature(pathGT)
+    if key in _stores and np.array_equal(_stores[key][0], signature):
+        return _stores[key][1]
+
+    pathNpz = key+".npz"
+    store = None
+    if os.path.exists(pathNpz):
+        try:
+            with np.load(pathNpz) as data:
+                cached = np.array_equal(data["signature"], signature)
+            if cached:
+                store = AnnotationStore.from_npz(pathNpz)
+        except (IOError, ValueError, KeyError):
+            store = None
+
+    if store is None:
+        store = AnnotationStore.from_directory(pathGT)
+        try:
+            store.save_npz(pathNpz, signature)
+        except IOError:
+            print("Could not save annotation store", pathNpz)
+
+    _stores[key] = (signature, store)
+    return store
@@ -1,51 +1,81 @@
 import cv2
+import numpy as np
+from functools import partial
 from ImageFeature import get_cropped_masked_image
+from ParallelExecution import parallel_map
 from matplotlib import pyplot as plt
 
+# 8 bit HSV ranges of OpenCV
+HUE_BINS = 180
+SAT_BINS = 256
+
 def RGB2HSV(image):
-    # converts RGB image array into H, S, V, unidimensional ordered list
+    # converts RGB image array into H, S, V, unidimensional ordered arrays
     hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
     hue, sat, val = hsv[:,:,0], hsv[:,:,1], hsv[:,:,2]
-    return (image2list(hue), image2list(sat), image2list(val))
+    return (hue.ravel(), sat.ravel(), val.ravel())
 
 def image2list(image):
     # convert image array into unidimensional(pixel) ordered list
-    imageL =  image.tolist()
-    pxL = []
-    for rows in imageL:
-        for px in rows:
-            pxL.append(px)
-    return pxL
-            
+    return image.reshape(-1, image.shape[2]).tolist() if image.ndim == 3 else image.ravel().tolist()
+
 def get_px_values(dfSingle, path):
-    # return hue and sat values for valid px  
+    # return hue and sat values for valid px (any channel different from 0)
     image = get_cropped_masked_image(dfSingle, path)
-    hueL, satL, valL = RGB2HSV(image)
-    imageL = image2list(image)
-    validHue = []
-    validSat = []
-    pxCount = 0
-    for px in imageL:
-        if any(px):
-            validHue.append(hueL[pxCount])
-            validSat.append(satL[pxCount])
-        pxCount += 1
-    return (validHue, validSat)
-
-def get_color_histogram(df, path):
+    hue, sat, val = RGB2HSV(image)
+    valid = image.reshape(-1, image.shape[2]).any(axis=1)
+    return (hue[valid], sat[valid])
+
+def get_px_histogram(dfSingle, path):
+    # joint (hue, sat) histogram of the valid px of one sign
+    (hue, sat) = get_px_values(dfSingle, path)
+    codes = hue.astype(np.intp)*SAT_BINS + sat
+    return np.bincount(codes, minlength=HUE_BINS*SAT_BINS).reshape(HUE_BINS, SAT_BINS)
+
+def chunk_histogram(dfChunk, path):
+    # sum of the histograms of the signs of dfChunk, so workers return one
+    # small array per chunk and never the pixel values
+    histogram = np.zeros((HUE_BINS, SAT_BINS), dtype=np.int64)
+    for i in range(len(dfChunk)):
+        histogram += get_px_histogram(dfChunk.iloc[i], path)
+    return histogram
+
+def compute_color_histograms(df, path, workers=1, chunksize=32):
+    """
+    Hue/saturation histogram of every signal type
+
+    Signs are processed in chunks of chunksize rows of one type over
+    parallel_map, and the histograms are accumulated as they are returned.
+
+    return: dictionary type -> int array (HUE_BINS, SAT_BINS), where [h, s]
+    counts the valid px with hue h and saturation s
+    """
+    types = sorted(df.Type.unique())
+    chunks = []
+    for typeSignal in types:
+        typeDf = df[df.Type == typeSignal]
+        for start in range(0, len(typeDf), chunksize):
+            chunks.append((typeSignal, typeDf.iloc[start:start+chunksize]))
+
+    results = parallel_map(partial(chunk_histogram, path=path), [chunk for (typeSignal, chunk) in chunks], workers)
+
+    histograms = dict((typeSignal, np.zeros((HUE_BINS, SAT_BINS), dtype=np.int64)) for typeSignal in types)
+    for (typeSignal, chunk), (histogram, error) in zip(chunks, results):
+        if error is not None:
+            print("Error processing signs of type", typeSignal, "->", error)
+            continue
+        histograms[typeSignal] += histogram
+    return histograms
+
+def get_color_histogram(df, path, workers=1):
     # creates color histograms in HSV for each signalType in the df
     colors = ['k', 'r', 'g', 'b', 'm', 'c', 'y']
-    for typeSignal in sorted(df.Type.unique()):
-        typeDf = df[df.Type == typeSignal]    
-        hueL = []
-        satL = []
-        for i in range(len(typeDf)):
-            dfSingle = typeDf.iloc[i]     
-            (hueSingle, satSingle) = get_px_values(dfSingle, path)
-            hueL.extend(hueSingle)
-            satL.extend(satSingle)
-        plt.hist(hueL, bins = 25, color = colors.pop(0))
+    histograms = compute_color_histograms(df, path, workers)
+    for typeSignal in sorted(histograms):
+        hueCount = histograms[typeSignal].sum(axis=1)
+        plt.hist(np.arange(HUE_BINS), bins = 25, range = (0, HUE_BINS), weights = hueCount, color = colors.pop(0))
         plt.ylabel('f')
         plt.xlabel('hue')
         plt.title('signalType '+typeSignal)
-        plt.show()
\ No newline at end of file
+        plt.show()
+    return histograms
@@ -0,0 +1,61 @@
+import numpy as np
+import cv2
+
+def build_color_lut(hsv_rang):
+    """
+    Lookup tables for a set of HSV ranges
+
+    hsv_rang: sequence lower0, upper0, lower1, upper1, ... of inclusive
+              [H, S, V] bounds, as used by cv2.inRange
+
+    Each table maps a channel value (0..255) to a bit mask with bit k set
+    when the value is inside range k. A pixel belongs to range k when bit k
+    is set for its three channels.
+
+    return: (hueLUT, satLUT, valLUT)
+    """
+    nRanges = len(hsv_rang)//2
+    if nRanges > 64:
+        raise ValueError("At most 64 color ranges are supported")
+    dtype = np.uint8 if nRanges <= 8 else np.uint64
+    values = np.arange(256)
+    luts = [np.zeros(256, dtype=dtype) for c in range(3)]
+
+    for k in range(nRanges):
+        lower = np.asarray(hsv_rang[2*k])
+        upper = np.asarray(hsv_rang[2*k+1])
+        bit = dtype(1) << dtype(k)
+        for c in range(3):
+            inside = (values >= lower[c]) & (values <= upper[c])
+            luts[c][inside] |= bit
+
+    return tuple(luts)
+
+def apply_color_lut(hsvImage, lut):
+    """
+    Mask of the pixels inside any of the ranges of the lookup tables
+
+    hsvImage: uint8 HSV image
+    lut: tables returned by build_color_lut
+
+    return: uint8 mask with 255 for the selected pixels, like cv2.inRange
+    """
+    (hueLUT, satLUT, valLUT) = lut
+    if hueLUT.dtype != np.uint8:
+        # more than 8 ranges do not fit the 8 bit tables of cv2.LUT
+        bits = hueLUT[hsvImage[:,:,0]] & satLUT[hsvImage[:,:,1]] & valLUT[hsvImage[:,:,2]]
+        return np.where(bits != 0, np.uint8(255), np.uint8(0))
+    # one lookup per channel, then the ranges shared by the three channels
+    (hue, sat, val) = cv2.split(hsvImage)
+    bits = cv2.bitwise_and(cv2.LUT(hue, hueLUT), cv2.LUT(sat, satLUT))
+    bits = cv2.bitwise_and(bits, cv2.LUT(val, valLUT))
+    return cv2.compare(bits, 0, cv2.CMP_NE)
+
+# color ranges of the signals, lower and upper [H, S, V] bounds
+hsv_rang = (
+     np.array([0,150,50]), np.array([20, 255, 255]) #RED
+     ,np.array([160,150,50]), np.array([180, 255, 255]) #DARK RED
+     ,np.array([100,150,50]), np.array([140, 255, 255]) #BLUE
+)
+# lookup tables of hsv_rang, shared by the color segmentations
+COLOR_LUT = build_color_lut(hsv_rang)
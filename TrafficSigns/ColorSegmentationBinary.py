@@ -1,13 +1,12 @@
 from ImageFeature import get_full_image
+from ColorLUT import apply_color_lut, COLOR_LUT
+from TemplateBank import TemplateBank
 import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 
-hsv_rang = (
-     np.array([0,150,50]), np.array([20, 255, 255]) #RED
-     ,np.array([160,150,50]), np.array([180, 255, 255]) #DARK RED
-     ,np.array([100,150,50]), np.array([140, 255, 255]) #BLUE
-)
+# templates of the signal shapes, read once and resized on demand
+TEMPLATE_BANK = TemplateBank("template/temp{}.png", range(1,9))
 
 def apply_morphology_operations(mask):
 
@@ -25,20 +24,8 @@ def apply_morphology_operations(mask):
     
 
 def apply_color_mask(fullImage):
-    
-    size_hsv_rang = np.size(hsv_rang,0)
-    for i in range(0, size_hsv_rang-1, 2):
-        lower = hsv_rang[i]
-        upper = hsv_rang[i+1] 
-        
-        mask = cv2.inRange(fullImage, lower, upper)
-        if i==0:
-            maskConcatenated = mask
-        else:
-            maskConcatenated = cv2.add(maskConcatenated, mask)
-            
-
-    return maskConcatenated
+    # every range of ColorLUT.hsv_rang in a single lookup per pixel
+    return apply_color_lut(fullImage, COLOR_LUT)
 
 
 
@@ -54,8 +41,8 @@ def color_segmentation_binary(df, path):
         fullMask = np.zeros((sizeImg[0], sizeImg[1]))
         # Color space change
 
+        rgbimg = cv2.cvtColor(fullImage, cv2.COLOR_BGR2RGB)
         fullImage = cv2.cvtColor(fullImage, cv2.COLOR_BGR2HSV)
-        rgbimg = cv2.cvtColor(fullImage, cv2.COLOR_HSV2RGB)
         
         maskColor = apply_color_mask(fullImage)
         maskMorph = apply_morphology_operations(maskColor)
@@ -145,11 +132,10 @@ def get_templete_matching(x, y ,w, h, maskSegmented, image):
     maximumFinal= 0;
     tipo = "NULL"
     
-    for i in range(1,9):
-        maskTemplate = cv2.imread("template/temp"+str(i)+".png",0)
-        maskTemplate = cv2.resize(maskTemplate,(w-1,h-1))
-        # Perform match operations. 
-        res = cv2.matchTemplate(maskSegmented, maskTemplate, cv2.TM_CCOEFF_NORMED) 
+    # Perform match operations of every template at once
+    responses = TEMPLATE_BANK.match(maskSegmented, w-1, h-1)
+    
+    for i, res in enumerate(responses, 1):
           
         # Specify a threshold 
         if (i == 2 or 6):
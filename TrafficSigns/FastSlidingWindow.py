@@ -2,153 +2,218 @@ import cv2
 import numpy as np
 from ImageFeature import get_full_mask, get_full_mask_result, get_full_image, save_text_file,get_full_mask_window_result
 import os
+from functools import partial
+from ParallelExecution import parallel_map
+from IntegralImage import integral_image, window_sum
 
-def fast_sw(df, path, dfStats):
+def fast_sw(df, path, dfStats, workers=1, chunksize=1):
+    """
+    Fast sliding window detection of every image in df
+
+    workers: processes used to analyse the images (None uses every core)
+    chunksize: images sent to a worker at once
+
+    Images whose mask can not be processed are reported and get no windows
+    return: list of (name, listBbox) in df order
+    """
 #    start_time = time.clock()
     # Create constraints from DS study
-    ROWS_MIN = min(dfStats['YMin'].tolist())
-    COLS_MIN = min(dfStats['XMin'].tolist())
-    FILL_RATIO_MIN = min(dfStats['FillRatioMin'].tolist())
+    (FILL_RATIO_MIN, ROWS_MIN, COLS_MIN) = fast_sw_constraints(dfStats)
+    rows = [df.iloc[i] for i in range(len(df))]
+    worker = partial(fast_sw_single, path=path, fillRatioMin=FILL_RATIO_MIN, rowsMin=ROWS_MIN, colsMin=COLS_MIN)
     # dictionary to store BBlist per image
     dsListBB=[]
-    for i in range(len(df)):
-        dfSingle = df.iloc[i]
-        mask = get_full_mask_window_result(dfSingle, path+"resultMask/")
-        # First BB candidate --> full image      
-        (imgRows, imgCols) = np.shape(mask)
-        BB = np.array([[0,0],[imgRows,imgCols]])
-        # iterate!
-        listBB = evaluate_image_wrap(mask, FILL_RATIO_MIN, ROWS_MIN, COLS_MIN, BB)
-        # joinb candidate bbs
-        joinBB = join_bbs(listBB.copy())
-        # rejoinv posible new intersections
-        finalBB = join_bbs(joinBB.copy())
-        # safe and boxes polotting!       
-        to_list(finalBB)
-        dsListBB.append((dfSingle['Image'][0:-4],to_list(finalBB)))  
-        
-       
-        im = cv2.cvtColor(mask.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)
-        
-        pathSave="datasets/test/gtResult/PKL/FAST_PICKEL_MASK/"
-        mask_name=dfSingle['Image'][0:-4]+".png"
-        
-        
-        listb = to_list(finalBB)
-    
-        mask2 = np.zeros(im.shape, np.uint8)
-        
-        if len(listb)>0:
-            for i in range(0, len(listb)):
-                #print (mask_name, listb[i][1],listb[i][3],listb[i][0],listb[i][2])
-                mask2[listb[i][1]:listb[i][3],listb[i][0]:listb[i][2]] = im[listb[i][1]:listb[i][3],listb[i][0]:listb[i][2]]
-#                from matplotlib import pyplot as plt
-#                plt.imshow(mask2)
-#                plt.show()
-#        #Save Images
-        if not os.path.exists(pathSave):
-            os.makedirs(pathSave)
-            
-        from matplotlib import pyplot as plt
-        
-        cv2.imwrite(pathSave+mask_name, mask2)
-        
-#        # save visual result for testing purposes
-#        maskbw =cv2.cvtColor(mask.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)        
-#        for j in range(len(finalBB)):
-#            BB = finalBB[j].tolist()
-#            cv2.rectangle( maskbw, (BB[0][1],BB[0][0]), (BB[1][1],BB[1][0]), (0, 255, 255), 5)
-#        subPath = "resultWindows/fast/"
-#        totalPath = path + subPath
-#        if not os.path.exists(totalPath):
-#            os.makedirs(totalPath)
-#        cv2.imwrite(totalPath+dfSingle['Image'], maskbw)
+    for dfSingle, (result, error) in zip(rows, parallel_map(worker, rows, workers, chunksize)):
+        if error is not None:
+            print("Error processing", dfSingle['Image'], "->", error)
+            result = (dfSingle['Image'][0:-4], [])
+        dsListBB.append(result)
          
     return dsListBB
 
+def fast_sw_single(dfSingle, path, fillRatioMin, rowsMin, colsMin):
+    """
+    Fast sliding window detection of one image, saves the masked result
+    return: (name, listBbox)
+    """
+    mask = get_full_mask_window_result(dfSingle, path+"resultMask/")
+    if mask is None:
+        raise IOError("Could not read mask of "+dfSingle['Image']+" in "+path+"resultMask/")
+    listb = detect_fast_windows(mask, fillRatioMin, rowsMin, colsMin)
+    
+    im = cv2.cvtColor(mask.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)
+    
+    pathSave="datasets/test/gtResult/PKL/FAST_PICKEL_MASK/"
+    mask_name=dfSingle['Image'][0:-4]+".png"
+    
+    mask2 = np.zeros(im.shape, np.uint8)
+    
+    if len(listb)>0:
+        for i in range(0, len(listb)):
+            #print (mask_name, listb[i][1],listb[i][3],listb[i][0],listb[i][2])
+            mask2[listb[i][1]:listb[i][3],listb[i][0]:listb[i][2]] = im[listb[i][1]:listb[i][3],listb[i][0]:listb[i][2]]
+#            from matplotlib import pyplot as plt
+#            plt.imshow(mask2)
+#            plt.show()
+    #Save Images (several workers may create the folder at once)
+    os.makedirs(pathSave, exist_ok=True)
+    
+    cv2.imwrite(pathSave+mask_name, mask2)
+    
+#    # save visual result for testing purposes
+#    maskbw =cv2.cvtColor(mask.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)        
+#    for j in range(len(finalBB)):
+#        BB = finalBB[j].tolist()
+#        cv2.rectangle( maskbw, (BB[0][1],BB[0][0]), (BB[1][1],BB[1][0]), (0, 255, 255), 5)
+#    subPath = "resultWindows/fast/"
+#    totalPath = path + subPath
+#    if not os.path.exists(totalPath):
+#        os.makedirs(totalPath)
+#    cv2.imwrite(totalPath+dfSingle['Image'], maskbw)
+    
+    return dfSingle['Image'][0:-4], listb
+
+def fast_sw_constraints(dfStats):
+    # (fillRatioMin, rowsMin, colsMin) from the DS study
+    return (min(dfStats['FillRatioMin'].tolist()), min(dfStats['YMin'].tolist()), min(dfStats['XMin'].tolist()))
+
+def detect_fast_windows(mask, fillRatioMin, rowsMin, colsMin):
+    """
+    Fast sliding window detection over a mask already in memory
+    return: list of merged windows [r0, c0, r1, c1]
+    """
+    # First BB candidate --> full image      
+    (imgRows, imgCols) = np.shape(mask)
+    BB = np.array([[0,0],[imgRows,imgCols]])
+    # iterate!
+    listBB = evaluate_image_wrap(mask, fillRatioMin, rowsMin, colsMin, BB)
+    # join overlapping candidate bbs
+    finalBB = join_bbs(listBB)
+    # safe and boxes polotting!       
+    return to_list(finalBB)
+
 def to_list(list_in):
-    bb_list = []
-    for bb in list_in:
-        bb_list.append([bb[0][0],bb[0][1], bb[1][0],bb[1][1]])
-    return bb_list
+    # boxes as lists of [r0, c0, r1, c1]
+    return np.array(list_in, dtype=int).reshape(-1, 4).tolist()
         
 def evaluate_image_wrap(img, fillRatioMin, rowsMin, colsMin, BB):   
-    listBB, currentBB, status = evaluate_image(img.copy(), fillRatioMin, rowsMin, colsMin, BB.copy(), BB.copy(), listBB=[])
-    return listBB
+    # fill ratios of every region are queried from the summed-area table
+    return evaluate_image(integral_image(img), fillRatioMin, rowsMin, colsMin, BB)
         
-def evaluate_image(img, fillRatioMin, rowsMin, colsMin, currentBB, oldBB, listBB):
-    (imgRows, imgCols) = np.shape(img)
-    imgOnes = np.count_nonzero(img)  
-    imgArea = imgRows*imgCols
-    imgFillRatio = imgOnes/imgArea
+def evaluate_image(integral, fillRatioMin, rowsMin, colsMin, BB):
+    """
+    Quadtree search of candidate windows over the summed-area table of a mask
+
+    A region whose fill ratio is above fillRatioMin is a candidate, otherwise
+    it is split into four overlapping quadrants (55% of its size) until the
+    regions are smaller than rowsMin x colsMin. Regions are visited with an
+    explicit stack in the same order as a depth-first recursion, and regions
+    without any pixel are discarded without being split.
+
+    integral: summed-area table of the mask (IntegralImage.integral_image)
+    BB: [[r0, c0], [r1, c1]] box reported for the full mask
+
+    return: (n,4) array of candidate boxes [r0, c0, r1, c1]
+    """
+    (imgRows, imgCols) = (integral.shape[0]-1, integral.shape[1]-1)
+    listBB = []
+    # each region: rows/cols of the mask it covers and the box it reports
+    stack = [(0, 0, imgRows, imgCols) + tuple(np.ravel(BB))]
     
-    if(imgRows < rowsMin or imgCols < colsMin):
-        # Windows already too small
-        return listBB, oldBB, False
-    elif(imgFillRatio > fillRatioMin):
-        # Candidate found
-        listBB.append(currentBB.copy())
-        return listBB, oldBB, False   
-    else:
-        # FillRatio too small, need to zoom in and evaluate again!
-        halfRows = int(imgRows*.45)
-        halfCols = int(imgCols*.45)
-        # top-left quadrant
-        oldBB = currentBB.copy()
-        currentBB += np.array([[0, 0],[-halfRows, -halfCols]])       
-        subImg = img[:-(halfRows+1) , :-(halfCols+1)]
-        listBB, currentBB, status = evaluate_image(subImg, fillRatioMin, rowsMin, colsMin, currentBB, oldBB, listBB)
-        # top-right quadrant
-        if(status):
-            currentBB = oldBB.copy()
-        else:
-            oldBB = currentBB.copy()
-        currentBB += np.array([[0, halfCols+1],[-halfRows, 0]])       
-        subImg = img[:-(halfRows+1) , halfCols:]
-        listBB, currentBB, status = evaluate_image(subImg, fillRatioMin, rowsMin, colsMin, currentBB, oldBB, listBB)
-        # bottom-left quadrant
-        if(status):
-            currentBB = oldBB.copy()
-        else:
-            oldBB = currentBB.copy()
-        currentBB += np.array([[halfRows+1, 0],[0,-halfCols]])    
-        subImg = img[halfRows:, :-(halfCols+1)]
-        listBB, currentBB, status = evaluate_image(subImg, fillRatioMin, rowsMin, colsMin, currentBB, oldBB, listBB)
-        # bottom-right quadrant
-        if(status):
-            currentBB = oldBB.copy()
+    while stack:
+        (sr0, sc0, sr1, sc1, br0, bc0, br1, bc1) = stack.pop()
+        (rows, cols) = (sr1-sr0, sc1-sc0)
+        
+        if(rows < rowsMin or cols < colsMin or rows*cols == 0):
+            # Windows already too small
+            continue
+        imgOnes = int(window_sum(integral, sc0, sr0, sc1, sr1))
+        if(imgOnes == 0):
+            # Empty region, none of its quadrants can be a candidate
+            continue
+        elif(imgOnes/(rows*cols) > fillRatioMin):
+            # Candidate found
+            listBB.append((br0, bc0, br1, bc1))
         else:
-            oldBB = currentBB.copy()
-        currentBB += np.array([[halfRows+1, halfCols+1],[0, 0]])     
-        subImg = img[halfRows:,  halfCols:]
-        listBB, currentBB, status = evaluate_image(subImg, fillRatioMin, rowsMin, colsMin, currentBB, oldBB, listBB)
-        return listBB, currentBB, True
+            # FillRatio too small, need to zoom in and evaluate again!
+            halfRows = int(rows*.45)
+            halfCols = int(cols*.45)
+            # pushed in reverse order so top-left is evaluated first
+            # bottom-right quadrant
+            stack.append((sr0+halfRows, sc0+halfCols, sr1, sc1,
+                          br0+halfRows+1, bc0+halfCols+1, br1, bc1))
+            # bottom-left quadrant
+            stack.append((sr0+halfRows, sc0, sr1, sc1-halfCols-1,
+                          br0+halfRows+1, bc0, br1, bc1-halfCols))
+            # top-right quadrant
+            stack.append((sr0, sc0+halfCols, sr1-halfRows-1, sc1,
+                          br0, bc0+halfCols+1, br1-halfRows, bc1))
+            # top-left quadrant
+            stack.append((sr0, sc0, sr1-halfRows-1, sc1-halfCols-1,
+                          br0, bc0, br1-halfRows, bc1-halfCols))
     
-    return listBB, oldBB, False
+    return np.array(listBB, dtype=int).reshape(-1, 4)
 
 def join_bbs(listBB):
-    jointBB = []
-    sortedBB = sorted(listBB, key=lambda x:x[-1][-1])
-    while(len(sortedBB)>0):
-        jointBB.append(sortedBB.pop())
-        for bb in reversed(sortedBB):
-            if(overlap(bb, jointBB[-1])):
-                jointBB[-1] = max_bb(bb, jointBB[-1])  
-                sortedBB.pop()
-    return jointBB
-                
-def overlap(bb1, bb2):
-    dr = min(bb1[1][0], bb2[1][0]) - max(bb1[0][0], bb2[0][0])
-    dc = min(bb1[1][1], bb2[1][1]) - max(bb1[0][1], bb2[0][1])
-    if(dc>=0 and dr>=0):
-        return dc*dr
-    else :
-        return 0
+    """
+    Merges every group of overlapping boxes into the box enclosing the group
+
+    Groups are the connected components of boxes overlapping with a positive
+    area, found with a sweep over the rows and a union-find. Enclosing boxes
+    of different groups can still overlap, so they are merged again until
+    no two boxes overlap.
+
+    listBB: (n,4) array (or list) of boxes [r0, c0, r1, c1]
+    return: (m,4) array of merged boxes
+    """
+    jointBB = np.array(listBB, dtype=int).reshape(-1, 4)
+    while True:
+        mergedBB = merge_overlapping(jointBB)
+        if len(mergedBB) == len(jointBB):
+            return mergedBB
+        jointBB = mergedBB
+
+def find_root(parent, i):
+    # union-find root with path halving
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
 
-def max_bb(bb1, bb2):
-    (rmin, cmin) = (min(bb1[0][0], bb2[0][0]), min(bb1[0][1], bb2[0][1]))
-    (rmax, cmax) = (max(bb1[1][0], bb2[1][0]), max(bb1[1][1], bb2[1][1]))
-    return np.array([[rmin,cmin],[rmax,cmax]])
+def merge_overlapping(boxes):
+    # one pass: boxes of each connected component replaced by their union
+    n = len(boxes)
+    parent = list(range(n))
+    
+    # sweep boxes by their first row, only boxes starting before the current
+    # one ends can overlap it
+    order = np.argsort(boxes[:, 0], kind="stable")
+    starts = boxes[order, 0]
+    stops = np.searchsorted(starts, boxes[order, 2], side="left")
+    for k in range(n):
+        i = order[k]
+        cand = order[k+1:stops[k]]
+        if len(cand) == 0:
+            continue
+        dr = np.minimum(boxes[cand, 2], boxes[i, 2]) - np.maximum(boxes[cand, 0], boxes[i, 0])
+        dc = np.minimum(boxes[cand, 3], boxes[i, 3]) - np.maximum(boxes[cand, 1], boxes[i, 1])
+        for j in cand[(dr > 0) & (dc > 0)]:
+            parent[find_root(parent, j)] = find_root(parent, i)
+    
+    roots = np.array([find_root(parent, i) for i in range(n)], dtype=int)
+    # components numbered by their first box
+    (_, first, labels) = np.unique(roots, return_index=True, return_inverse=True)
+    labels = np.argsort(np.argsort(first))[labels]
+    
+    merged = np.empty((len(first), 4), dtype=int)
+    merged[:, :2] = np.iinfo(int).max
+    merged[:, 2:] = np.iinfo(int).min
+    np.minimum.at(merged[:, 0], labels, boxes[:, 0])
+    np.minimum.at(merged[:, 1], labels, boxes[:, 1])
+    np.maximum.at(merged[:, 2], labels, boxes[:, 2])
+    np.maximum.at(merged[:, 3], labels, boxes[:, 3])
+    
+    return merged
         
 #def show_bb(dfSingle, path, bb = []):
 #    img = get_full_image(dfSingle, path)
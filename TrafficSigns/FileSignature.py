@@ -0,0 +1,9 @@
+import os
+import numpy as np
+
+def directory_signature(path, prefix="", suffix=""):
+    # number of files of path named prefix*suffix and their newest
+    # modification time, changes whenever one is added, removed or edited
+    mtimes = [entry.stat().st_mtime for entry in os.scandir(path)
+              if entry.name.startswith(prefix) and entry.name.endswith(suffix)]
+    return np.array([len(mtimes), max(mtimes) if mtimes else 0.0])
@@ -0,0 +1,85 @@
+import os
+import cv2
+import threading
+from collections import OrderedDict
+
+class ImageCache(object):
+    """
+    Decoded images kept in memory up to a byte budget
+
+    Entries are keyed by (path, flags, mtime), so a file rewritten on disk is
+    decoded again. Cached arrays are read-only: callers that draw or write
+    over an image must copy it first. Reads are thread safe: entries and
+    counters only change under a lock, images are decoded outside of it.
+
+    maxBytes: budget of decoded pixel data
+    policy: 'lru' evicts the least recently used image,
+            'fifo' evicts the oldest decoded image
+    """
+    def __init__(self, maxBytes=512*1024*1024, policy='lru'):
+        if policy not in ('lru', 'fifo'):
+            raise ValueError("Unknown eviction policy: "+str(policy))
+        self.maxBytes = maxBytes
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def read(self, path, flags=1):
+        # cv2.imread(path, flags) through the cache, None if it can not be read
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        key = (path, flags, mtime)
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                if self.policy == 'lru':
+                    self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+
+        image = cv2.imread(path, flags)
+        if image is None or image.nbytes > self.maxBytes:
+            return image
+        image.flags.writeable = False
+
+        with self.lock:
+            if key in self.entries:
+                # decoded meanwhile by another thread
+                return self.entries[key]
+            self.entries[key] = image
+            self.currentBytes += image.nbytes
+            while self.currentBytes > self.maxBytes and self.entries:
+                (oldKey, oldImage) = self.entries.popitem(last=False)
+                self.currentBytes -= oldImage.nbytes
+                self.evictions += 1
+        return image
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.currentBytes = 0
+
+    def stats(self):
+        # counters of the cache, to check its hit rate
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'images': len(self.entries), 'bytes': self.currentBytes}
+
+# cache shared by every reader of this process
+IMAGE_CACHE = ImageCache()
+
+def configure_image_cache(maxBytes=512*1024*1024, policy='lru'):
+    # replaces the process cache, dropping the images it held
+    global IMAGE_CACHE
+    IMAGE_CACHE = ImageCache(maxBytes, policy)
+    return IMAGE_CACHE
+
+def read_image(path, flags=1):
+    return IMAGE_CACHE.read(path, flags)
@@ -9,8 +9,21 @@ import numpy as np
 from scipy.stats import norm
 from matplotlib import pyplot as plt
 from ImageFeature import getGridOfImage 
+from ColorLUT import build_color_lut, apply_color_lut
 
 
+# HSV ranges of every color with the morphology that filters the noise of
+# each range (rojo is split in two ranges). Lookup tables are built once
+COLOR_FILTERS = {
+    "red": ((np.array([0,65,75]), np.array([12, 255, 255]), cv2.MORPH_CLOSE),
+            (np.array([240,65,75]), np.array([255, 255, 255]), cv2.MORPH_OPEN)),
+    "black": ((np.array([0,0,0]), np.array([180, 255, 30]), cv2.MORPH_CLOSE),),
+    "white": ((np.array([0,0,200]), np.array([180, 255, 255]), cv2.MORPH_CLOSE),),
+    "blue": ((np.array([100,150,0]), np.array([140, 255, 255]), cv2.MORPH_CLOSE),),
+}
+COLOR_LUTS = {colorType: [(build_color_lut((lower, upper)), morph) for (lower, upper, morph) in ranges]
+              for colorType, ranges in COLOR_FILTERS.items()}
+
 def pixelescolorDetection(imagen, colorType,signalType, name):
     #Filtrar el ruido aplicando un OPEN seguido de un CLOSE
     #plt.imsave("./Resultados/"+signalType+"/"+name+'imagenentradapixelcolorDetection.jpg', imagen)        
@@ -19,66 +32,19 @@ def pixelescolorDetection(imagen, colorType,signalType, name):
     print(signalType)
     print(name)
 
-    if colorType == "red":
-        rojo_bajos1 = np.array([0,65,75], dtype=np.uint8)
-        rojo_altos1 = np.array([12, 255, 255], dtype=np.uint8)
-        rojo_bajos2 = np.array([240,65,75], dtype=np.uint8)
-        rojo_altos2 = np.array([256, 255, 255], dtype=np.uint8)
-        print("rojo_altos2")
-        #Detectar los pixeles de la imagen que esten dentro del rango de rojos
-        mascara_rojo1 = cv2.inRange(imagen, rojo_bajos1, rojo_altos1)
-        mascara_rojo2 = cv2.inRange(imagen, rojo_bajos2, rojo_altos2)
-        
-        #Filtrar el ruido aplicando un OPEN seguido de un CLOSE
-        mascara_rojo1 = cv2.morphologyEx(mascara_rojo1, cv2.MORPH_CLOSE, kernel)
-        mascara_rojo2 = cv2.morphologyEx(mascara_rojo2, cv2.MORPH_OPEN, kernel)
-        #Unir las dos mascaras con el comando cv2.add() del color rojo
-        mask = cv2.add(mascara_rojo1, mascara_rojo2)
-        #plt.imsave("./Resultados/"+signalType+"/"+name+'mask_red.jpg', mask)        
-
-    elif colorType == "black":
-        black_1 = np.array([0,0,0], dtype=np.uint8)
-        black_2 = np.array([180, 255, 30], dtype=np.uint8)
-        
-        #Detectar los pixeles de la imagen que esten dentro del rango de rojos
-        mascara_black = cv2.inRange(imagen, black_1, black_2)
-        
-        #Filtrar el ruido aplicando un OPEN seguido de un CLOSE
-        mascara_black = cv2.morphologyEx(mascara_black, cv2.MORPH_CLOSE, kernel)
-        #Mascara de pixeles negros
-        mask =  mascara_black
-        #plt.imsave("./Resultados/"+signalType+"/"+name+'mask_black.jpg', mask)        
-    elif colorType == "white":
-        white_1 = np.array([0,0,200], dtype=np.uint8)
-        white_2 = np.array([180, 255, 255], dtype=np.uint8)
-        
-        #Detectar los pixeles de la imagen que esten dentro del rango de rojos
-        mascara_white = cv2.inRange(imagen, white_1, white_2)
-        
-        #Filtrar el ruido aplicando un OPEN seguido de un CLOSE
-        mascara_white = cv2.morphologyEx(mascara_white, cv2.MORPH_CLOSE, kernel)
-        #Mascara de pixeles blancos
-        mask =  mascara_white
-        #plt.imsave("./Resultados/"+signalType+"/"+name+'mask_white.jpg', mask)        
-
-        
-    elif colorType == "blue":
-        blue_1 = np.array([100,150,0], dtype=np.uint8)
-        blue_2 = np.array([140, 255, 255], dtype=np.uint8)
-        
-        #Detectar los pixeles de la imagen que esten dentro del rango de rojos
-        mascara_blue  = cv2.inRange(imagen, blue_1, blue_2)
-        
-        #Filtrar el ruido aplicando un OPEN seguido de un CLOSE
-        mascara_blue  = cv2.morphologyEx(mascara_blue, cv2.MORPH_CLOSE, kernel)
-        #plt.imsave("./Resultados/"+signalType+"/"+name+'mascara_blue.jpg', mascara_blue)
-
-        #Mascara de pixeles blancos
-        mask =  mascara_blue  
-        #plt.imsave("./Resultados/"+signalType+"/"+name+'mask_blue.jpg', mask)        
-
-    else:
+    if colorType not in COLOR_LUTS:
         print("Any color signal mask !")        
+        return None
+
+    mask = None
+    for (lut, morph) in COLOR_LUTS[colorType]:
+        #Detectar los pixeles de la imagen que esten dentro del rango
+        mascara = apply_color_lut(imagen, lut)
+        #Filtrar el ruido de cada rango
+        mascara = cv2.morphologyEx(mascara, morph, kernel)
+        #Unir las mascaras con el comando cv2.add()
+        mask = mascara if mask is None else cv2.add(mask, mascara)
+    #plt.imsave("./Resultados/"+signalType+"/"+name+'mask_'+colorType+'.jpg', mask)        
     return mask
 
 def changeSpaceColor(imagen, spaceType, signalType,name):
@@ -1,25 +1,47 @@
 import numpy as np
 import cv2
-from createDataframe import load_annotations
+from AnnotationStore import load_annotation_store, gt_name
 import os
+import hashlib
+import pickle
+from ParallelExecution import parallel_map
+from ImageCache import read_image
+
+# Every getter decodes through the process image cache (see ImageCache).
+# Returned arrays are read-only and crops are views of the cached image,
+# copy them before drawing over them
 
 def get_full_image(dfSingle, path):
-    return cv2.imread(path + dfSingle['Image'],1)
+    return read_image(path + dfSingle['Image'],1)
 
 def get_cropped_image(dfSingle, path):
     image = get_full_image(dfSingle, path)
     return image[int(dfSingle["UpLeft(Y)"]):int(dfSingle["DownRight(Y)"]), int(dfSingle["UpLeft(X)"]):int(dfSingle["DownRight(X)"])]
 
+# mask stores registered with set_mask_store, by mask directory
+MASK_STORES = {}
+
+def set_mask_store(pathMask, store):
+    # masks of pathMask are read from store (see MaskStore) instead of
+    # decoding the png files, None removes it
+    if store is None:
+        MASK_STORES.pop(os.path.normpath(pathMask), None)
+    else:
+        MASK_STORES[os.path.normpath(pathMask)] = store
+
 def get_full_mask(dfSingle, path):
-    return cv2.imread(path+'mask/' + dfSingle['Mask'], 0)
+    store = MASK_STORES.get(os.path.normpath(path+'mask/'))
+    if store is not None and dfSingle['Mask'] in store:
+        return store.get_mask(dfSingle['Mask'])
+    return read_image(path+'mask/' + dfSingle['Mask'], 0)
 
 def get_full_mask_window_result(dfSingle, path):
     split = dfSingle["Image"].split(".")
     name_mask = "mask."+split[0]+"."+split[1]+".png"
-    return cv2.imread(path+name_mask, 0)
+    return read_image(path+name_mask, 0)
 
 def get_full_mask_result(dfSingle, path, maskType):
-    return cv2.imread(path+'resultMask/'+maskType+'/' + dfSingle['Mask'], 0)
+    return read_image(path+'resultMask/'+maskType+'/' + dfSingle['Mask'], 0)
 
 def get_cropped_mask(dfSingle, path):
     image = get_full_mask(dfSingle, path)
@@ -35,8 +57,11 @@ def get_cropped_masked_image(dfSingle, path):
     mask = get_cropped_mask(dfSingle, path)
     return cv2.bitwise_and(image,image,mask = mask)
 
-def save_gt(pathToSave, pathToget, gtfile):
-    annotations = load_annotations(pathToget+gtfile)
+def save_gt(pathToSave, pathToget, gtfile, store=None):
+    # store: annotation store of pathToget, loaded here when not given
+    if store is None:
+        store = load_annotation_store(pathToget)
+    annotations = store.get(gt_name(gtfile))
     
     with open(pathToSave+gtfile, "w") as f:
         for i,element in enumerate(annotations[0]):   
@@ -77,25 +102,97 @@ def get_mask_aspect(dfSingle, path):
 
     return imgFillRatio, imgFormFactor, imgX, imgY
 
-def get_ground_truth(df, path):
-    fillRatioL = []
-    formFactorL = []
-    areaL = []
-    xL = []
-    yL = []
-    
-    for i in range(len(df)):       
-        fillRatio, formFactor, x, y = get_mask_aspect(df.iloc[i], path)    
-        xL.append(x)
-        yL.append(y)
-        areaL.append(x*y)
-        fillRatioL.append(fillRatio)
-        formFactorL.append(formFactor)
-   
-    df["FillRatio"]=fillRatioL
-    df["FormFactor"]=formFactorL
-    df["Area"]=areaL
-    df["X"]=xL
-    df["Y"]=yL
+def file_hash(pathFile):
+    # md5 of the file content
+    with open(pathFile, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def mask_features(pathMask, boxes):
+    """
+    FillRatio, FormFactor, X and Y of every box of one mask, decoded once
+
+    boxes: array (k, 4) with UpLeft(Y), UpLeft(X), DownRight(Y), DownRight(X)
+    return: array (k, 4), with the same values as get_mask_aspect
+    """
+    mask = cv2.imread(pathMask, 0)
+    if mask is None:
+        raise IOError("Could not read mask "+pathMask)
+    features = np.zeros((len(boxes), 4))
+    for k, (y1, x1, y2, x2) in enumerate(np.asarray(boxes).astype(int)):
+        crop = mask[y1:y2, x1:x2]
+        (imgX, imgY) = np.shape(crop)
+        imgFillRatio = np.count_nonzero(crop)/(imgX*imgY)
+        imgFormFactor = min(imgX, imgY)/max(imgX, imgY)
+        features[k] = (imgFillRatio, imgFormFactor, imgX, imgY)
+    return features
+
+def mask_features_item(item):
+    # parallel_map entry point, item is (pathMask, boxes)
+    return mask_features(*item)
+
+def get_ground_truth(df, path, workers=1, chunksize=4):
+    """
+    Adds FillRatio, FormFactor, Area, X and Y of every sign to df
+
+    Every mask is decoded once for all of its signs, masks are processed over
+    parallel_map, and the features are cached in <path>.features.pkl keyed by
+    the md5 of the mask file and its boxes, so unchanged masks are not decoded
+    again.
+    """
+    pathCache = path.rstrip("/")+".features.pkl"
+    cache = {}
+    if os.path.exists(pathCache):
+        try:
+            with open(pathCache, "rb") as f:
+                cache = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            cache = {}
+
+    cols = ["UpLeft(Y)", "UpLeft(X)", "DownRight(Y)", "DownRight(X)"]
+    allBoxes = df[cols].to_numpy(dtype=float)
+    features = np.full((len(df), 4), np.nan)
+
+    # rows of every mask, and cache lookup by content
+    groups = {}
+    for row, maskName in enumerate(df["Mask"]):
+        groups.setdefault(maskName, []).append(row)
+
+    newCache = {}
+    pending = []
+    for maskName, rows in groups.items():
+        pathMask = path+'mask/'+maskName
+        boxes = allBoxes[rows]
+        key = (file_hash(pathMask), boxes.tobytes())
+        if key in cache:
+            features[rows] = cache[key]
+            newCache[key] = cache[key]
+        else:
+            pending.append((maskName, rows, key, (pathMask, boxes)))
+
+    results = parallel_map(mask_features_item, [item for (maskName, rows, key, item) in pending], workers, chunksize)
+    for (maskName, rows, key, item), (result, error) in zip(pending, results):
+        if error is not None:
+            print("Error processing", maskName, "->", error)
+            continue
+        features[rows] = result
+        newCache[key] = result
+
+    if pending:
+        try:
+            with open(pathCache, "wb") as f:
+                pickle.dump(newCache, f)
+        except IOError:
+            print("Could not save ground truth features", pathCache)
+
+    sizes = features[:,2:]
+    if np.isfinite(sizes).all():
+        # crop sizes stay integers unless a mask failed
+        sizes = sizes.astype(int)
+
+    df["FillRatio"]=features[:,0]
+    df["FormFactor"]=features[:,1]
+    df["Area"]=sizes[:,0]*sizes[:,1]
+    df["X"]=sizes[:,0]
+    df["Y"]=sizes[:,1]
         
     return df
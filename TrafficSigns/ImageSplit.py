@@ -1,92 +1,19 @@
 from matplotlib import pyplot as plt
 import pandas as pd
 import numpy as np
-import cv2
+import shutil
 from ImageFeature import save_gt
+from AnnotationStore import load_annotation_store
 import os
+from SignalStats import RunningStats
 
 def compute_stats(df):
     #Stadistical study for the different signal types in order to properly
     #split the training set into two sets,  ~70% and ~30% with the best 
     #main features represented in both of them
-    cols = ['Type', 'FillRatioMean', 'FillRatioStd', 'FillRatioMax', 'FillRatioMin', 'FormFactorMean', 'FormFactorStd', 'FormFactorMax', 'FormFactorMin', 'AreaMean', 'AreaStd', 'AreaMax', 'AreaMin', 'XMax', 'XMin', 'XMean', 'XStd', 'YMax', 'YMin', 'YMean', 'YStd']
-    dfStats = pd.DataFrame(columns=cols)
-
-    types = df.Type.unique().tolist()
-    types.sort()
-    fillRatioMean = []
-    fillRatioStd = []    
-    fillRatioMax = []
-    fillRatioMin = []
-    formFactorMean = []
-    formFactorStd = []    
-    formFactorMax = []
-    formFactorMin = []
-    areaMean = []
-    areaStd = []    
-    areaMax = []
-    areaMin = []      
-    xMean = []
-    xStd = []      
-    xMax = []
-    xMin = []    
-    yMean = []
-    yStd = []
-    yMax = []
-    yMin = []        
-    
-    for typeSignal in types:
-        typeDf = df[df.Type == typeSignal]
-        fillRatioMean.append(np.mean(typeDf['FillRatio']))
-        fillRatioStd.append(np.std(typeDf['FillRatio']))
-        fillRatioMax.append(np.max(typeDf['FillRatio']))
-        fillRatioMin.append(np.min(typeDf['FillRatio']))
-        formFactorMean.append(np.mean(typeDf['FormFactor']))
-        formFactorStd.append(np.std(typeDf['FormFactor']))
-        formFactorMax.append(np.max(typeDf['FormFactor']))
-        formFactorMin.append(np.min(typeDf['FormFactor']))        
-        areaMean.append(np.mean(typeDf['Area']))
-        areaStd.append(np.std(typeDf['Area']))
-        areaMax.append(np.max(typeDf['Area']))
-        areaMin.append(np.min(typeDf['Area']))
-        xMean.append(np.mean(typeDf['X']))
-        xStd.append(np.std(typeDf['X']))        
-        xMax.append(np.max(typeDf['X']))
-        xMin.append(np.min(typeDf['X'])) 
-        yMean.append(np.mean(typeDf['Y']))
-        yStd.append(np.std(typeDf['Y']))        
-        yMax.append(np.max(typeDf['Y']))
-        yMin.append(np.min(typeDf['Y'])) 
-        
-    dfStats['Type'] = types
-    
-    dfStats['FillRatioMean'] = fillRatioMean
-    dfStats['FillRatioStd'] = fillRatioStd
-    dfStats['FillRatioMax'] = fillRatioMax
-    dfStats['FillRatioMin'] = fillRatioMin
-    
-    dfStats['FormFactorMean'] = formFactorMean
-    dfStats['FormFactorStd'] = formFactorStd
-    dfStats['FormFactorMax'] = formFactorMax
-    dfStats['FormFactorMin'] = formFactorMin
-    
-    dfStats['AreaMean'] = areaMean
-    dfStats['AreaStd'] = areaStd
-    dfStats['AreaMax'] = areaMax
-    dfStats['AreaMin'] = areaMin
-    
-    dfStats['XMean'] = xMean
-    dfStats['XStd'] = xStd
-    dfStats['XMax'] = xMax
-    dfStats['XMin'] = xMin
-
-    dfStats['YMean'] = yMean
-    dfStats['YStd'] = yStd    
-    dfStats['YMax'] = yMax
-    dfStats['YMin'] = yMin
-
-        
-    return dfStats
+    #Every aggregate is computed in one groupby pass, see RunningStats to
+    #update the stats with new annotated images
+    return RunningStats().update(df).to_frame()
 
 
 def plot_stats(df):        
@@ -105,68 +32,101 @@ def plot_stats(df):
             plt.show()
         colors.pop(0)
     
-def sort_by_mean(reference, data):
-    dataError = []
-    meanData = np.mean(data)
+def split_assignment(df, ratio=0.3, seed=None):
+    """
+    Stratified train/validation assignment of the rows of df
 
-    for value in data:
-        dataError.append(abs(value - meanData))
-    sortedReference = [x for _,x in sorted(zip(dataError, reference))]
+    Inside every signal type rows are sorted by the distance of their Area to
+    the mean Area of the type, and every row whose rank crosses a multiple of
+    1/ratio goes to validation, so each type keeps ~ratio of its signs spread
+    over all sizes. With seed None the phase reproduces the fixed 2, 5, 8 of
+    every 10 pattern for ratio 0.3; a seed draws a random phase per type.
 
-    return sortedReference
-        
+    return: (order, isValidation), positions of the rows of df in split order
+    and a boolean array telling the set of every position
+    """
+    (typeCode, types) = pd.factorize(df.Type)
+    area = df.Area.to_numpy(dtype=float)
+    meanArea = df.groupby(typeCode).Area.transform('mean').to_numpy(dtype=float)
+    dataError = np.abs(area-meanArea)
 
-def split_by_type(df, pathimages):
-    # Prepares train and valid dataframes to follow df structure
-    col = list(df)
-    train = pd.DataFrame(columns=col)
-    validation = pd.DataFrame(columns=col)
-    # Divides df images for signal type
-    for typeSignal in df.Type.unique():
-        typeDf = df[df.Type == typeSignal]
-        # Sorts out subDf according to their signal area size
-        reference = sort_by_mean(typeDf.index.values.tolist(), typeDf.Area.tolist())
-        # Divides 30 - 70
-        k = 0
-        for indexRef in reference:
-            if(k == 2 or k == 5 or k == 8):
-                validation = validation.append(typeDf[typeDf.index == indexRef])
-            else:
-                train = train.append(typeDf[typeDf.index == indexRef])
-            if(k == 9):
-                k = 0
-            else:
-                k += 1           
-    
-    create_splitFolders('train')
-    create_splitFolders('validation')
-    # Saves test and validation images in new subfolders
-    for image in validation["Image"].tolist():  
-        imageTrain = cv2.imread(pathimages+image,1)
-        cv2.imwrite("./datasets/split/validation/"+image, imageTrain)
-        
-    for mask in validation["Mask"].tolist():
-        maskTrain = cv2.imread(pathimages+"/mask/"+mask,1)
-        cv2.imwrite("./datasets/split/validation/mask/"+mask, maskTrain)
-        
-    for image in train["Image"].tolist():  
-        imageTrain = cv2.imread(pathimages+image,1)
-        cv2.imwrite("./datasets/split/train/"+image, imageTrain)
-        
-    for mask in train["Mask"].tolist():
-        maskTrain = cv2.imread(pathimages+"/mask/"+mask,1)
-        cv2.imwrite("./datasets/split/train/mask/"+mask, maskTrain)
-    
-    for image in train["Image"].tolist():
+    # by type (order of appearance), distance to the mean, then index
+    order = np.lexsort((df.index.to_numpy(), dataError, typeCode))
+    sortedType = typeCode[order]
+    groupStart = np.searchsorted(sortedType, sortedType, side='left')
+    rank = np.arange(len(order))-groupStart
+
+    if seed is None:
+        phase = np.full(len(types), 0.35)
+    else:
+        phase = np.random.RandomState(seed).uniform(size=len(types))
+    phase = phase[sortedType]
+    isValidation = np.floor((rank+1)*ratio+phase) > np.floor(rank*ratio+phase)
+
+    return order, isValidation
+
+def copy_file(source, destination):
+    # byte copy, a previous link is removed first so the source is never
+    # written through it
+    if os.path.lexists(destination):
+        os.remove(destination)
+    shutil.copyfile(source, destination)
+
+def link_file(source, destination):
+    # hardlink, symlink when hardlinks are not possible, byte copy otherwise.
+    # The pixel data is never decoded or re-encoded
+    if os.path.lexists(destination):
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            return
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(source), destination)
+        except OSError:
+            copy_file(source, destination)
+
+def export_split(dfSplit, pathimages, pathSplit, mode):
+    # image and mask files of one split, each file once
+    transfer = link_file if mode == 'link' else copy_file
+    for image in dfSplit["Image"].unique().tolist():
+        transfer(pathimages+image, pathSplit+image)
+    for mask in dfSplit["Mask"].unique().tolist():
+        transfer(pathimages+"/mask/"+mask, pathSplit+"mask/"+mask)
+    # the gt directory is checked once, not once per image
+    store = load_annotation_store(pathimages+"gt/")
+    for image in dfSplit["Image"].unique().tolist():
         split = image.split(".")
         gtfile = "gt."+split[0]+"."+split[1]+".txt"
-        save_gt("./datasets/split/train/gt/","./datasets/train/gt/",  gtfile)
-            
-    for image in validation["Image"].tolist():
-        split = image.split(".")
-        gtfile = "gt."+split[0]+"."+split[1]+".txt"  
-        save_gt("./datasets/split/validation/gt/","./datasets/train/gt/",  gtfile)
-             
+        save_gt(pathSplit+"gt/", pathimages+"gt/", gtfile, store)
+
+def split_by_type(df, pathimages, ratio=0.3, seed=None, mode='link'):
+    """
+    Splits df into train and validation sets, ~70% and ~30% of every type
+
+    mode: 'link'     images and masks are hardlinked (or symlinked/copied)
+                     into datasets/split/train and datasets/split/validation
+          'copy'     images and masks are byte copied into the split folders
+          'manifest' only datasets/split/train.csv and validation.csv are
+                     written, files stay in pathimages
+    """
+    order, isValidation = split_assignment(df, ratio, seed)
+    train = df.iloc[order[~isValidation]]
+    validation = df.iloc[order[isValidation]]
+
+    if mode == 'manifest':
+        os.makedirs("./datasets/split/", exist_ok=True)
+        train.to_csv("./datasets/split/train.csv")
+        validation.to_csv("./datasets/split/validation.csv")
+    elif mode == 'link' or mode == 'copy':
+        create_splitFolders('train')
+        create_splitFolders('validation')
+        # Saves test and validation images in new subfolders
+        export_split(validation, pathimages, "./datasets/split/validation/", mode)
+        export_split(train, pathimages, "./datasets/split/train/", mode)
+    else:
+        raise ValueError("Unknown split mode: "+str(mode))
                
     return train, validation
 
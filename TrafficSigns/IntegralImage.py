@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+def integral_image(mask):
+    """
+    Summed-area table of the non-zero pixels of a mask
+
+    The table has one extra leading row and column of zeros, so the number
+    of non-zero pixels in mask[y1:y2, x1:x2] is
+    sat[y2,x2] - sat[y1,x2] - sat[y2,x1] + sat[y1,x1]
+    """
+    return cv2.integral((mask > 0).astype(np.uint8), sdepth=cv2.CV_32S)
+
+def window_sum(sat, x1, y1, x2, y2):
+    # number of non-zero pixels inside [y1:y2, x1:x2], works with scalars
+    # or any broadcastable arrays of coordinates
+    return sat[y2, x2] - sat[y1, x2] - sat[y2, x1] + sat[y1, x1]
+
+def multi_scale_fill_ratio(sat, windowSizes, stride=1):
+    """
+    Fill ratio of every window size on its own grid of positions
+
+    windowSizes: list of (winW, winH)
+    stride: spacing in pixels of the grid of top-left corners, one value for
+            every size or a list with the stride of each size
+
+    return: float32 array of shape (scale, i, j), where [s, i, j] is the fill
+    ratio of window s with top-left corner (j*stride[s], i*stride[s]). Only
+    windows that fit inside the mask are scored, the rest of the array (the
+    padding of the sizes with coarser grids) is 0.
+    """
+    (rows, cols) = (sat.shape[0]-1, sat.shape[1]-1)
+    strides = np.broadcast_to(stride, (len(windowSizes),))
+    ny = [len(range(0, rows-winH+1, s)) for (winW, winH), s in zip(windowSizes, strides)]
+    nx = [len(range(0, cols-winW+1, s)) for (winW, winH), s in zip(windowSizes, strides)]
+    fillTensor = np.zeros((len(windowSizes), max(ny, default=0), max(nx, default=0)), dtype=np.float32)
+
+    for k, ((winW, winH), s) in enumerate(zip(windowSizes, strides)):
+        if ny[k] == 0 or nx[k] == 0:
+            continue
+        # corners of the grid only: one count per window of this size
+        yEnd = rows-winH+1
+        xEnd = cols-winW+1
+        counts = (sat[winH::s, winW::s] - sat[:yEnd:s, winW::s]
+                  - sat[winH::s, :xEnd:s] + sat[:yEnd:s, :xEnd:s])
+        # counts and area are exact in float32, so the ratio is rounded once
+        fillTensor[k, :ny[k], :nx[k]] = counts.astype(np.float32)/np.float32(winW*winH)
+
+    return fillTensor
@@ -0,0 +1,104 @@
+import os
+import cv2
+import numpy as np
+from FileSignature import directory_signature
+
+def mask_signature(pathMask):
+    # number of png masks and newest modification time
+    return directory_signature(pathMask, suffix=".png")
+
+class MaskStore(object):
+    """
+    Binary masks of a directory bit-packed in one memory-mapped file
+
+    Every mask is stored as np.packbits of its rows (8 pixels per byte)
+    one after the other in <dir>.bits, and <dir>.bits.npz keeps the name,
+    offset, shape and foreground value of each of them. The packed file is
+    mapped the first time a mask is requested, so reading a mask only
+    touches its own pages.
+    """
+    def __init__(self, pathBits, names, offsets, shapes, values):
+        self.pathBits = pathBits
+        self.names = [str(name) for name in names]
+        self.index = dict(zip(self.names, range(len(self.names))))
+        self.offsets = offsets
+        self.shapes = shapes
+        self.values = values
+        self.bits = None
+
+    @classmethod
+    def build(cls, pathMask, pathBits, signature):
+        # packs every png mask of pathMask into pathBits, masks are decoded
+        # once here and never again
+        names = sorted(name for name in os.listdir(pathMask) if name.endswith(".png"))
+        offsets = np.zeros(len(names), dtype=np.int64)
+        shapes = np.zeros((len(names), 2), dtype=np.int64)
+        values = np.zeros(len(names), dtype=np.uint8)
+        offset = 0
+        with open(pathBits, "wb") as f:
+            for k, name in enumerate(names):
+                mask = cv2.imread(os.path.join(pathMask, name), 0)
+                if mask is None:
+                    raise IOError("Could not read mask "+os.path.join(pathMask, name))
+                packed = np.packbits(mask > 0, axis=1)
+                f.write(packed.tobytes())
+                offsets[k] = offset
+                shapes[k] = mask.shape
+                # masks are binary, the non zero value is restored on read
+                values[k] = mask.max() if mask.any() else 255
+                offset += packed.nbytes
+
+        np.savez(pathBits+".npz", names=np.array(names, dtype=str), offsets=offsets,
+                 shapes=shapes, values=values, signature=signature)
+        return cls(pathBits, names, offsets, shapes, values)
+
+    @classmethod
+    def load(cls, pathBits):
+        with np.load(pathBits+".npz") as data:
+            return cls(pathBits, data["names"], data["offsets"], data["shapes"], data["values"])
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_packed(self, name):
+        # (rows, ceil(cols/8)) view of the packed mask inside the mapped file
+        if self.bits is None:
+            if os.path.getsize(self.pathBits) == 0:
+                self.bits = np.zeros(0, dtype=np.uint8)
+            else:
+                self.bits = np.memmap(self.pathBits, dtype=np.uint8, mode="r")
+        k = self.index[name]
+        (rows, cols) = self.shapes[k]
+        rowBytes = (cols+7)//8
+        return self.bits[self.offsets[k]:self.offsets[k]+rows*rowBytes].reshape(rows, rowBytes)
+
+    def get_mask(self, name):
+        """
+        Mask <name> unpacked, as cv2.imread(path, 0) would return it for a
+        binary mask (uint8 with 0 and its foreground value)
+        """
+        k = self.index[name]
+        bits = np.unpackbits(self.get_packed(name), axis=1, count=int(self.shapes[k][1]))
+        return bits*self.values[k]
+
+def load_mask_store(pathMask):
+    """
+    Mask store of the directory pathMask (ex: datasets/train/mask/)
+
+    The packed file is pathMask+".bits" (ex: datasets/train/mask.bits) and
+    is rebuilt only when the masks of the directory change.
+    """
+    pathBits = os.path.normpath(pathMask)+".bits"
+    signature = mask_signature(pathMask)
+    if os.path.exists(pathBits) and os.path.exists(pathBits+".npz"):
+        try:
+            with np.load(pathBits+".npz") as data:
+                cached = np.array_equal(data["signature"], signature)
+            if cached:
+                return MaskStore.load(pathBits)
+        except (IOError, ValueError, KeyError):
+            pass
+    return MaskStore.build(pathMask, pathBits, signature)
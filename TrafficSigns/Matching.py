@@ -9,54 +9,76 @@ from ImageFeature import get_cropped_image,get_full_image
 import numpy as np
 import cv2
 
-def mediatemplate(df, path):
-    
+def canonical_size(typeDf):
+    # (width, height) of the biggest crop of the type, the size every crop
+    # was finally resized to when the templates were added one by one
+    widths = (typeDf["DownRight(X)"].astype(int) - typeDf["UpLeft(X)"].astype(int)).to_numpy()
+    heights = (typeDf["DownRight(Y)"].astype(int) - typeDf["UpLeft(Y)"].astype(int)).to_numpy()
+    biggest = len(widths)-1-np.argmax((widths*heights)[::-1])
+    return (int(widths[biggest]), int(heights[biggest]))
+
+def mediatemplate(df, path, size=None, median=False, variance=False, save=True):
+    """
+    Grey mean template of every signal type
+
+    Every crop of a type is converted to grey, resized to a common size and
+    accumulated in a running sum, so only one crop is in memory at a time
+    (unless the median is requested, which needs all of them).
+
+    size: (width, height) of the templates, by default the biggest crop of
+          each type
+    median, variance: also compute the per-pixel median / variance template
+    save: writes path+'cropImage/mean.<type>.png' (and median.<type>.png)
+
+    return: dictionary type -> {'mean': array, 'median': ..., 'variance': ...}
+    """
+    templates = {}
     for typeSignal in sorted(df.Type.unique()):
-        typeDf = df[df.Type == typeSignal]  
-        a=len(typeDf)
-        for i in range (a):#(len(typeDf)):
-            dfSingle = typeDf.iloc[i]    
-            gtimage = get_cropped_image(dfSingle, path)
-            imageName = dfSingle['Image'] 
-            gtimage= cv2.cvtColor(gtimage, cv2.COLOR_BGR2GRAY)
+        typeDf = df[df.Type == typeSignal]
+        dim = size if size is not None else canonical_size(typeDf)
+
+        total = np.zeros((dim[1], dim[0]))
+        totalSq = np.zeros((dim[1], dim[0]))
+        stack = []
+        a = 0
+        for i in range(len(typeDf)):
+            gtimage = get_cropped_image(typeDf.iloc[i], path)
+            if gtimage is None or gtimage.size == 0:
+                continue
+            gtimage = cv2.cvtColor(gtimage, cv2.COLOR_BGR2GRAY)
             #to do a mean we need a float type image 
-            gtimage=gtimage.astype(float)
-            #save firs image
-            if (i==0):
-                template = gtimage.copy()
-                #divided by number of images
-                for k in range(0,template.shape[0]):
-                    for j in range(0,template.shape[1]):
-                        pixel = template.item(k, j)/a
-                        template.itemset(k, j, pixel)
-            #media for all images
-            if (i>=1):
-                sizegt= gtimage.shape[1]*gtimage.shape[0]
-                sizetemp= template.shape[1]*template.shape[0]
-
-                #resize to large image
-                if(sizetemp>sizegt):
-                    dim=(template.shape[1],template.shape[0])    
-                    gtimage=cv2.resize(gtimage, dim, interpolation = cv2.INTER_AREA)
-                else:
-                    dim=(gtimage.shape[1],gtimage.shape[0])    
-                    template=cv2.resize(template, dim, interpolation = cv2.INTER_AREA)
-
-                #divided by number of images
-                for k in range(0,gtimage.shape[0]):
-                    for j in range(0,gtimage.shape[1]):
-                        pixel = gtimage.item(k, j)/a
-                        gtimage.itemset(k, j, pixel)               
-                #add 2 images
-                template= cv2.add(gtimage,template)
-                cv2.imwrite(path+'cropImage/'+imageName[:-3]+'add.'+'png', template)
+            gtimage = cv2.resize(gtimage.astype(float), dim, interpolation = cv2.INTER_AREA)
+            total += gtimage
+            if variance:
+                totalSq += gtimage*gtimage
+            if median:
+                stack.append(gtimage)
+            a += 1
+        if a == 0:
+            continue
+
+        #divided by number of images
+        result = {'mean': total/a}
+        if variance:
+            result['variance'] = np.maximum(totalSq/a - result['mean']**2, 0)
+        if median:
+            result['median'] = np.median(np.stack(stack), axis=0)
+        templates[typeSignal] = result
+
+        if save:
+            cv2.imwrite(path+'cropImage/mean.'+typeSignal+'.png', np.clip(np.round(result['mean']), 0, 255).astype(np.uint8))
+            if median:
+                cv2.imwrite(path+'cropImage/median.'+typeSignal+'.png', np.clip(np.round(result['median']), 0, 255).astype(np.uint8))
+
+    return templates
 
 
 def Matching_GRIS(df, path):
      for i in range(len(df)):       
         # Gets images one by one
         dfSingle = df.iloc[i]
-        img_rgb  = get_full_image(dfSingle, path)              
+        # cached images are read-only, rectangles are drawn over a copy
+        img_rgb  = get_full_image(dfSingle, path).copy()
         imageName = dfSingle['Image'] 
         img_gray = cv2.cvtColor(img_rgb , cv2.COLOR_BGR2GRAY)
         txtFile = open("TXT/gt."+imageName[:-3]+"txt", "w")
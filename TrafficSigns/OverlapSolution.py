@@ -1,66 +1,61 @@
 # import the necessary packages
 import numpy as np
 
-def non_max_suppression_slow(boxes, overlapThresh):
-# if there are no boxes, return an empty list
+def non_max_suppression(boxes, overlapThresh, scores=None, criterion="area"):
+    """
+    Vectorized non-maximum suppression
+
+    boxes: (n,4) array of boxes [x1, y1, x2, y2] (startX, startY, endX, endY)
+    overlapThresh: boxes overlapping a picked box by more than this are removed
+    scores: optional (n,) array, boxes with higher score are picked first.
+            By default boxes are picked by their bottom-right x-coordinate
+    criterion: "area" -> intersection over the area of the removed box
+               "iou"  -> intersection over union
+
+    return: the picked boxes, in picking order
+    """
+    # if there are no boxes, return an empty list
     if len(boxes) == 0:
         return []
-
-    # initialize the list of picked indexes
-    pick = []
+    if criterion not in ("area", "iou"):
+        raise ValueError("Unknown overlap criterion: "+str(criterion))
 
     # grab the coordinates of the bounding boxes
-    y1 = boxes[:,0]
-    x1 = boxes[:,1]
-    y2 = boxes[:,2]
-    x2 = boxes[:,3]
+    x1 = boxes[:,0]
+    y1 = boxes[:,1]
+    x2 = boxes[:,2]
+    y2 = boxes[:,3]
 
-    # compute the area of the bounding boxes and sort the bounding
-    # boxes by the bottom-right y-coordinate of the bounding box
+    # compute the area of the bounding boxes and sort them by score (or by
+    # the bottom-right x-coordinate), the best box is the last one
     area = (x2 - x1 + 1) * (y2 - y1 + 1)
-    idxs = np.argsort(y2)
+    if scores is None:
+        idxs = np.argsort(x2)
+    else:
+        idxs = np.argsort(scores, kind="stable")
+
+    # initialize the list of picked indexes
+    pick = []
 
-    # keep looping while some indexes still remain in the indexes
-    # list
     while len(idxs) > 0:
-        # grab the last index in the indexes list, add the index
-        # value to the list of picked indexes, then initialize
-        # the suppression list (i.e. indexes that will be deleted)
-        # using the last index
+        # pick the last index and compare it against all the remaining ones
         last = len(idxs) - 1
         i = idxs[last]
         pick.append(i)
-        suppress = [last]
-
-        # loop over all indexes in the indexes list
-        for pos in range(len(idxs)):
-            # grab the current index
-            j = idxs[pos]
-
-            # find the largest (x, y) coordinates for the start of
-            # the bounding box and the smallest (x, y) coordinates
-            # for the end of the bounding box
-            xx1 = max(x1[i], x1[j])
-            yy1 = max(y1[i], y1[j])
-            xx2 = min(x2[i], x2[j])
-            yy2 = min(y2[i], y2[j])
-
-            # compute the width and height of the bounding box
-            w = max(0, xx2 - xx1 + 1)
-            h = max(0, yy2 - yy1 + 1)
+        rest = idxs[:last]
 
-            # compute the ratio of overlap between the computed
-            # bounding box and the bounding box in the area list
-            overlap = float(w * h) / area[j]
+        # intersection of the picked box with every remaining box at once
+        w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
 
-            # if there is sufficient overlap, suppress the
-            # current bounding box
-            if overlap > overlapThresh:
-                suppress.append(pos)
+        if criterion == "area":
+            overlap = inter / area[rest]
+        else:
+            overlap = inter / (area[i] + area[rest] - inter)
 
-        # delete all indexes from the index list that are in the
-        # suppression list
-        idxs = np.delete(idxs, suppress)
+        # keep only the boxes that do not overlap enough with the picked one
+        idxs = rest[overlap <= overlapThresh]
 
     # return only the bounding boxes that were picked
     return boxes[pick]
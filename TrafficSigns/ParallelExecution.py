@@ -0,0 +1,42 @@
+import multiprocessing
+
+class SafeCall(object):
+    """
+    Wraps a function so that an exception only fails the item being processed
+    Instances are picklable as long as func is a module level function
+    (or a functools.partial of one)
+    """
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, item):
+        try:
+            return self.func(item), None
+        except Exception as e:
+            return None, type(e).__name__+": "+str(e)
+
+def parallel_map(func, items, workers=1, chunksize=1):
+    """
+    Applies func to every item, over a pool of processes when workers != 1
+
+    workers: number of processes, None uses every core, 1 runs in this process
+    chunksize: number of items sent to a worker at once
+
+    return: list of (result, error) in the same order as items. error is None
+    when the item succeeded, otherwise result is None and error describes
+    the exception raised for that item
+    """
+    safeFunc = SafeCall(func)
+    items = list(items)
+
+    if workers == 1 or len(items) < 2:
+        return [safeFunc(item) for item in items]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(safeFunc, items, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
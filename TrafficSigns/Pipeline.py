@@ -0,0 +1,96 @@
+"""
+Streaming detection pipeline
+
+Every stage is a generator that receives and yields frames, dictionaries
+with the data of one image:
+    'name'      image name without extension
+    'image'     BGR image, decoded once
+    'colorMask' mask of the pixels inside the color ranges
+    'mask'      mask after the morphology filters
+    'bboxes'    windows found by the window search
+
+Stages can be chained in any order that provides the keys they need, and
+debug stages such as write_masks can be inserted anywhere to save
+intermediate results. Nothing is written to disk otherwise.
+"""
+
+import cv2
+import os
+from ImageFeature import get_full_image
+from ColorSegmentationBinary import apply_color_mask, apply_morphology_operations
+from SlidingWindow import detect_windows
+from FastSlidingWindow import detect_fast_windows, fast_sw_constraints
+
+def read_frames(df, path):
+    # decodes every image of the df once
+    for i in range(len(df)):
+        dfSingle = df.iloc[i]
+        image = get_full_image(dfSingle, path)
+        if image is None:
+            print("Error processing", dfSingle['Image'], "-> could not read image in", path)
+            continue
+        yield {'name': dfSingle['Image'][0:-4], 'image': image}
+
+def color_mask_stage(frames):
+    # HSV mask of the color ranges
+    for frame in frames:
+        hsv = cv2.cvtColor(frame['image'], cv2.COLOR_BGR2HSV)
+        frame['colorMask'] = apply_color_mask(hsv)
+        yield frame
+
+def morphology_stage(frames):
+    # noise removal over the color mask
+    for frame in frames:
+        frame['mask'] = apply_morphology_operations(frame['colorMask'])
+        yield frame
+
+def window_stage(frames, dfStats, task):
+    """
+    Window search over the mask of every frame
+
+    task: "SLW2" or "SLW3" for the sliding window (with overlap removal),
+          "SLW_FAST" for the quadtree search (with box merging)
+    """
+    if task == "SLW_FAST":
+        (fillRatioMin, rowsMin, colsMin) = fast_sw_constraints(dfStats)
+        search = lambda mask: detect_fast_windows(mask, fillRatioMin, rowsMin, colsMin)
+    elif task == "SLW2" or task == "SLW3":
+        method = 3 if task == "SLW3" else 2
+        search = lambda mask: detect_windows(mask, dfStats, method)
+    else:
+        raise ValueError("Entered method is invalid: "+str(task))
+
+    for frame in frames:
+        frame['bboxes'] = search(frame['mask'])
+        yield frame
+
+def write_masks(frames, pathSave, key='mask'):
+    # debug sink: saves frame[key] as mask.<name>.png and lets the frame pass
+    os.makedirs(pathSave, exist_ok=True)
+    for frame in frames:
+        cv2.imwrite(pathSave+"mask."+frame['name']+".png", frame[key])
+        yield frame
+
+def collect_results(frames):
+    # result sink: list of (name, listBbox), frame images are released
+    return [(frame['name'], frame['bboxes']) for frame in frames]
+
+def detection_pipeline(df, path, dfStats, task, debugPath=None):
+    """
+    read -> HSV mask -> morphology -> window search -> results, in memory
+
+    debugPath: when given, color and morphology masks are also written to
+               debugPath+"colorMask/" and debugPath+"morphologyMask/"
+
+    Images that can not be read are reported and skipped
+    return: list of (name, listBbox) in df order
+    """
+    frames = color_mask_stage(read_frames(df, path))
+    if debugPath is not None:
+        frames = write_masks(frames, debugPath+"colorMask/", 'colorMask')
+    frames = morphology_stage(frames)
+    if debugPath is not None:
+        frames = write_masks(frames, debugPath+"morphologyMask/", 'mask')
+    frames = window_stage(frames, dfStats, task)
+
+    return collect_results(frames)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# features summarized for every signal type
+STATS_FEATURES = ['FillRatio', 'FormFactor', 'Area', 'X', 'Y']
+
+# column order of the stats dataframe, as built by compute_stats
+STATS_COLUMNS = ['Type', 'FillRatioMean', 'FillRatioStd', 'FillRatioMax', 'FillRatioMin', 'FormFactorMean', 'FormFactorStd', 'FormFactorMax', 'FormFactorMin', 'AreaMean', 'AreaStd', 'AreaMax', 'AreaMin', 'XMax', 'XMin', 'XMean', 'XStd', 'YMax', 'YMin', 'YMean', 'YStd']
+
+class RunningStats(object):
+    """
+    Per signal type count, mean, std, min and max of STATS_FEATURES
+
+    Every update aggregates the new rows with a single groupby and merges
+    them with the current values (Chan et al. parallel update of the
+    Welford mean and sum of squared deviations), so growing the labelled
+    set does not require rescanning the rows already added.
+    """
+    def __init__(self, features=STATS_FEATURES):
+        self.features = list(features)
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def update(self, df):
+        # adds the rows of df (columns Type and features), aggregated with a
+        # single groupby
+        groups = df.groupby('Type')[self.features]
+        new = RunningStats(self.features)
+        new.count = groups.count()
+        new.mean = groups.mean()
+        new.m2 = groups.var(ddof=0)*new.count
+        new.min = groups.min()
+        new.max = groups.max()
+        return self.merge(new)
+
+    def merge(self, other):
+        # adds the rows summarized by another RunningStats
+        if other.count is None:
+            return self
+        if self.count is None:
+            (self.count, self.mean, self.m2, self.min, self.max) = (other.count, other.mean, other.m2, other.min, other.max)
+            return self
+
+        types = self.count.index.union(other.count.index)
+        nA = self.count.reindex(types, fill_value=0)
+        nB = other.count.reindex(types, fill_value=0)
+        meanA = self.mean.reindex(types, fill_value=0).fillna(0)
+        meanB = other.mean.reindex(types, fill_value=0).fillna(0)
+        n = nA+nB
+        # types without samples for a feature keep a 0/0 (NaN) mean
+        weightB = nB/n.where(n > 0)
+        delta = meanB-meanA
+
+        self.mean = meanA + delta*weightB
+        self.m2 = (self.m2.reindex(types, fill_value=0).fillna(0) + other.m2.reindex(types, fill_value=0).fillna(0)
+                   + delta**2*nA*weightB)
+        self.count = n
+        self.min = pd.concat([self.min, other.min]).groupby(level=0).min()
+        self.max = pd.concat([self.max, other.max]).groupby(level=0).max()
+        return self
+
+    def std(self):
+        # population standard deviation, like np.std
+        return np.sqrt(self.m2/self.count.where(self.count > 0))
+
+    def to_frame(self):
+        # stats dataframe with the columns of compute_stats, one row per type
+        if self.count is None:
+            return pd.DataFrame(columns=STATS_COLUMNS)
+        std = self.std()
+        dfStats = pd.DataFrame({'Type': self.count.index.tolist()})
+        for feature in self.features:
+            dfStats[feature+'Mean'] = self.mean[feature].to_numpy()
+            dfStats[feature+'Std'] = std[feature].to_numpy()
+            dfStats[feature+'Max'] = self.max[feature].to_numpy()
+            dfStats[feature+'Min'] = self.min[feature].to_numpy()
+
+        cols = [col for col in STATS_COLUMNS if col in dfStats.columns]
+        return dfStats[cols]
@@ -1,9 +1,12 @@
 import cv2
 import os
 import numpy as np
+from functools import partial
 from resizeImage import image_resize
-from OverlapSolution import non_max_suppression_slow
+from OverlapSolution import non_max_suppression
 from ImageFeature import get_full_mask, get_full_mask_window_result
+from ParallelExecution import parallel_map
+from IntegralImage import integral_image, window_sum, multi_scale_fill_ratio
 
 ## Method for sliding window
 def sliding_window(image, stepSize, windowSize):
@@ -19,13 +22,16 @@ def sliding_window(image, stepSize, windowSize):
         if y+windowSize[1] >= image.shape[0]:
                 break
 
-def get_window_size(df):
+def get_window_size(df, fromStats=False):
     """
      Method for setting window size
      to improve
        - min 
         - max
      Adaptar mida live
+
+     fromStats: when True the limits are the smallest and largest sign
+                width (Y) of the stats dataframe, otherwise the fixed 40/160
     """
     # Get window size from Aspect Ratio in the traffic signs
     
@@ -39,74 +45,98 @@ def get_window_size(df):
 #    winH_min = int(np.sqrt(minArea/meanAspect))
 #    winW_min = int(winH_min*meanAspect)
     
+    if fromStats:
+        # one row per type, so this is cheap even for a large labelled set
+        winW_min = int(df["YMin"].min())
+        winW_max = int(df["YMax"].max())
+        return winW_min, winW_max
+
     winW_min=40
     winW_max=160
     
     return winW_min, winW_max
 
 
-# Compute Fill Ratio
-def compute_fill_ratio(x,y, winW, winH, image):
-    imageSegmented = image[y:y+winH,x:x+winW]
-    fillRatioOnes = np.count_nonzero(imageSegmented)
-    (imgX, imgY) = np.shape(imageSegmented)
-    area = imgX*imgY
-    fillRatio = fillRatioOnes/area
-    
-    return fillRatio
+def refine_windows(integral, corners, sizes, shape, stepSize=2):
+    """
+    Best window around every detection, all detections at once
 
-def window_detection(image, stepSize, windowSize):
+    Each detection (x, y) of size (winW, winH) is analysed deeply in the region
+    of twice its size at stepSize, windows clipped to that region. The first
+    window (row-major) with the biggest fill ratio is kept.
+
+    corners: (n,2) array of x, y
+    sizes: (n,2) array of winW, winH
+    shape: (h, w) of the mask
+
+    return: (n,4) array of startX, startY, endX, endY
+    """
+    if len(corners) == 0:
+        return np.zeros((0, 4), dtype=int)
+    (h, w) = shape
+    x, y = corners[:, 0], corners[:, 1]
+    winW, winH = sizes[:, 0], sizes[:, 1]
+    
+    # Portion to be analyse deeply
+    maxx = np.minimum(x+winW*2, w)
+    maxy = np.minimum(y+winH*2, h)
+    # number of positions per axis, the last one may overhang the region
+    nx = -(-(maxx-x-winW)//stepSize)+1
+    ny = -(-(maxy-y-winH)//stepSize)+1
     
-    # init variables
-    winW= windowSize[0]
-    winH = windowSize[1]
+    offX = np.arange(nx.max())*stepSize
+    offY = np.arange(ny.max())*stepSize
+    validX = offX[np.newaxis, :] < (nx*stepSize)[:, np.newaxis]
+    validY = offY[np.newaxis, :] < (ny*stepSize)[:, np.newaxis]
     
-    candidateWindow= []
-    bigger =0
+    # (n, y, x) grids of window corners, padding positions point to the corner
+    x1 = (x[:, np.newaxis] + np.where(validX, offX, 0))[:, np.newaxis, :]
+    y1 = (y[:, np.newaxis] + np.where(validY, offY, 0))[:, :, np.newaxis]
+    x2 = np.minimum(x1+winW[:, np.newaxis, np.newaxis], maxx[:, np.newaxis, np.newaxis])
+    y2 = np.minimum(y1+winH[:, np.newaxis, np.newaxis], maxy[:, np.newaxis, np.newaxis])
+    filling = window_sum(integral, x1, y1, x2, y2)/((x2-x1)*(y2-y1))
+    filling[~(validY[:, :, np.newaxis] & validX[:, np.newaxis, :])] = -1
+    
+    best = np.argmax(filling.reshape(len(corners), -1), axis=1)
+    (bestY, bestX) = np.unravel_index(best, filling.shape[1:])
+    startX = x + offX[bestX]
+    startY = y + offY[bestY]
+    
+    return np.stack((startX, startY, startX+winW, startY+winH), axis=1)
 
-    # loop over the sliding window each image
-    for (x, y, window) in sliding_window(image, stepSize, windowSize=(winW, winH)):
-        
-        # if the window does not meet our desired window size, ignore it
-        if window.shape[0] != winH or window.shape[1] != winW:
-            continue
-        
-        filling = compute_fill_ratio(x, y, winW, winH, image)
-        
-        if filling > 0.4:  
-            stepSize=2
-            
-            # Portion to be analyse deeply 
-            maxx=winW*2
-            maxy=winH*2
-            
-            imageSegmented = image[y:y+maxy,x:x+maxx]      
-            
-            for (x_in, y_in, window_in) in sliding_window(imageSegmented, stepSize, windowSize=(winW, winH)):
-                
-                filling = compute_fill_ratio(x_in, y_in, winW, winH, imageSegmented) 
-                
-                if filling > bigger:
-                    bigger=filling
-                    startX = x+x_in
-                    startY = y+y_in
-                    endX = startX+winW
-                    endY=startY+winH
-                    possibleWindow = [startX, startY, endX, endY]
-                
-            candidateWindow.append(possibleWindow)
-            
-            bigger=0
-            
-    # Convert to numpy array for the overlap removal method
-    boundingBoxes = np.array(candidateWindow)
+def multi_scale_detection(integral, windowSizes, stepSizes, threshold=0.4):
+    """
+    Sliding window detection for several window sizes in one pass
+
+    Every size is scored only on its own sweep grid (multiples of its
+    stepSize), all sizes padded into a single (scale, i, j) tensor. The
+    first detection of every size is refined around its position.
+
+    return: list with the best window [startX, startY, endX, endY] of every
+    size that had any detection, in windowSizes order
+    """
+    (h, w) = (integral.shape[0]-1, integral.shape[1]-1)
+    windowSizes = np.array(windowSizes, dtype=int).reshape(-1, 2)
+    stepSizes = np.array(stepSizes, dtype=int).reshape(-1)
+    
+    fillTensor = multi_scale_fill_ratio(integral, windowSizes, stepSizes)
+    # the tensor is float32, comparing against a float32 threshold gives the
+    # same result as the float64 ratio against the float64 threshold
+    hits = (fillTensor > np.float32(threshold)).reshape(len(windowSizes), -1)
+    
+    # first detection (row-major) of every size, back to pixel positions
+    scales = np.flatnonzero(hits.any(axis=1))
+    if len(scales) == 0:
+        return []
+    (firstI, firstJ) = np.unravel_index(hits[scales].argmax(axis=1), fillTensor.shape[1:])
+    corners = np.stack((firstJ*stepSizes[scales], firstI*stepSizes[scales]), axis=1)
     
-    return boundingBoxes, candidateWindow
+    return refine_windows(integral, corners, windowSizes[scales], (h, w)).tolist()
 
 def overlapping_removal(boundingBoxes, overlapThreshold, image):
     
     # Remove Overlapping
-    pick = non_max_suppression_slow(boundingBoxes, overlapThreshold)
+    pick = non_max_suppression(boundingBoxes, overlapThreshold)
         
 #    # JUST TO VISUALIZE
 #        
@@ -121,17 +151,38 @@ def overlapping_removal(boundingBoxes, overlapThreshold, image):
 
 
 def compute_windows(df, pathToImage, line, dfStats, method): 
+    return compute_image_windows(df.iloc[line], pathToImage, dfStats, method)
+
+def get_window_name(dfSingle):
+    # image name without the extension
+    split = dfSingle["Image"].split(".")
+    return split[0]+"."+split[1]
+
+def compute_image_windows(dfSingle, pathToImage, dfStats, method):
     # Get image name
-    name = df["Image"].iloc[line]
-    split = name.split(".")
-    name = split[0]+"."+split[1]
-    
-    # load the image and define the window width and height
-    imageRead = df.iloc[line]
-    image = get_full_mask_window_result(imageRead, pathToImage)
+    name = get_window_name(dfSingle)
     
+    # load the image
+    image = read_window_mask(dfSingle, pathToImage)
+
+    return name, detect_windows(image, dfStats, method)
+
+def read_window_mask(dfSingle, pathToImage):
+    image = get_full_mask_window_result(dfSingle, pathToImage)
+    if image is None:
+        raise IOError("Could not read mask of "+dfSingle["Image"]+" in "+pathToImage)
+    return image
+
+def detect_windows(image, dfStats, method):
+    """
+    Sliding window detection over a mask already in memory
+    return: list of windows [startX, startY, endX, endY] after overlap removal
+    """
     (h, w)=image.shape[:2]    
+    # fill ratios of every window size are queried from the same table
+    integral = integral_image(image)
     
+    # define the window width and height
     overlapThreshold=0.3
     winW1, winW2 = get_window_size(dfStats)
     
@@ -140,18 +191,10 @@ def compute_windows(df, pathToImage, line, dfStats, method):
     else: 
         aspect = 1
 
-    severalSizes= []
-    
-    step=20
-    for i in range(winW1,winW2,step):
-        winW=i
-        winH=int(i*aspect)
-
-        stepSize= int(winW*0.66) # how much overlapp between windows
-        allBBoxes, allBBoxes_list = window_detection(image, stepSize, windowSize=(winW, winH))
-       
-        if allBBoxes_list:
-            severalSizes.append(allBBoxes_list[0])
+    # every window size is scored in one pass over the mask
+    windowSizes = [(i, int(i*aspect)) for i in range(winW1, winW2, 20)]
+    stepSizes = [int(winW*0.66) for (winW, winH) in windowSizes] # how much overlapp between windows
+    severalSizes = multi_scale_detection(integral, windowSizes, stepSizes)
    
     finalBBoxes = overlapping_removal(np.array(severalSizes), overlapThreshold, image)
     
@@ -160,48 +203,60 @@ def compute_windows(df, pathToImage, line, dfStats, method):
     else:
         listBbox = finalBBoxes
 
-    return name,listBbox
+    return listBbox
 
-def window_main(df, path, dfStats, typeW, method):
-    
-    finalBBoxes =[]
+def window_single(dfSingle, path, dfStats, method):
+    """
+    Sliding window detection of one image, saves the masked result
+    return: (name, listBbox)
+    """
+    name = get_window_name(dfSingle)
+    # the mask is read once for the detection and the saved result
+    image = read_window_mask(dfSingle, path)
+    listb = detect_windows(image, dfStats, method)
     
-    for i in range(df.shape[0]):
-         
-        name, listb = compute_windows(df, path, i, dfStats, method)
-           
-        
-        #finalBBoxes.append(listb)
-        
-        
-        finalBBoxes.append((name,listb))  
-        
-        imageRead = df.iloc[i]
-        image = get_full_mask_window_result(imageRead, path) 
-        
-        im = cv2.cvtColor(image.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)
+    im = cv2.cvtColor(image.astype('uint8') * 255, cv2.COLOR_GRAY2BGR)
 #            
-#        for j in range(len(listb)):
-#            startY = listb[j][0]
-#            startX = listb[j][1]
-#            endY = listb[j][2]
-#            endX = listb[j][3]
-#            cv2.rectangle(im, (startX, startY), (endX, endY), (0, 255, 255), 5)
+#    for j in range(len(listb)):
+#        startY = listb[j][0]
+#        startX = listb[j][1]
+#        endY = listb[j][2]
+#        endX = listb[j][3]
+#        cv2.rectangle(im, (startX, startY), (endX, endY), (0, 255, 255), 5)
 #       
-        pathSave="datasets/test/gtResult/PKL/SLW3_PICKEL_MASK/"
-        mask_name=name+".png"
-        
-        mask = np.zeros(im.shape,np.uint8)
-        if len(listb)>0:
-            mask[listb[0][1]:listb[0][3],listb[0][0]:listb[0][2]] = im[listb[0][1]:listb[0][3],listb[0][0]:listb[0][2]]
-        
-        #Save Images
-        if not os.path.exists(pathSave):
-            os.makedirs(pathSave)
-            
-        from matplotlib import pyplot as plt
+    pathSave="datasets/test/gtResult/PKL/SLW3_PICKEL_MASK/"
+    mask_name=name+".png"
+    
+    mask = np.zeros(im.shape,np.uint8)
+    if len(listb)>0:
+        mask[listb[0][1]:listb[0][3],listb[0][0]:listb[0][2]] = im[listb[0][1]:listb[0][3],listb[0][0]:listb[0][2]]
+    
+    #Save Images (several workers may create the folder at once)
+    os.makedirs(pathSave, exist_ok=True)
+    
+    cv2.imwrite(pathSave+mask_name, mask)
+    
+    return name, listb
+
+def window_main(df, path, dfStats, typeW, method, workers=1, chunksize=1):
+    """
+    Sliding window detection of every image in df
+
+    workers: processes used to analyse the images (None uses every core)
+    chunksize: images sent to a worker at once
+
+    Images whose mask can not be processed are reported and get no windows
+    return: list of (name, listBbox) in df order
+    """
+    rows = [df.iloc[i] for i in range(df.shape[0])]
+    worker = partial(window_single, path=path, dfStats=dfStats, method=method)
+    
+    finalBBoxes =[]
+    
+    for dfSingle, (result, error) in zip(rows, parallel_map(worker, rows, workers, chunksize)):
+        if error is not None:
+            print("Error processing", dfSingle["Image"], "->", error)
+            result = (get_window_name(dfSingle), [])
+        finalBBoxes.append(result)
         
-        cv2.imwrite(pathSave+mask_name, mask)
-#            
     return finalBBoxes
-         
\ No newline at end of file
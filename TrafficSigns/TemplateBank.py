@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+from collections import OrderedDict
+
+class TemplateBank(object):
+    """
+    Set of templates read once from disk, with an LRU cache of the resized
+    variants used to match candidates of different sizes
+
+    pathPattern: path of the templates with a {} for the template number,
+                 ex: "template/temp{}.png"
+    ids: numbers of the templates, in matching order
+    maxResized: maximum number of resized templates kept in memory
+    """
+    def __init__(self, pathPattern, ids, maxResized=512):
+        self.pathPattern = pathPattern
+        self.ids = list(ids)
+        self.maxResized = maxResized
+        self.templates = None
+        self.resized = OrderedDict()
+
+    def load(self):
+        # templates are read the first time they are needed
+        if self.templates is None:
+            templates = []
+            for i in self.ids:
+                template = cv2.imread(self.pathPattern.format(i), 0)
+                if template is None:
+                    raise IOError("Could not read template "+self.pathPattern.format(i))
+                templates.append(template)
+            self.templates = templates
+        return self.templates
+
+    def get_resized(self, index, w, h):
+        # template number ids[index] resized to (w, h)
+        key = (index, w, h)
+        if key in self.resized:
+            self.resized.move_to_end(key)
+            return self.resized[key]
+
+        template = cv2.resize(self.load()[index], (w, h))
+        self.resized[key] = template
+        if len(self.resized) > self.maxResized:
+            # evict the least recently used variant
+            self.resized.popitem(last=False)
+        return template
+
+    def match(self, candidate, w, h, method=cv2.TM_CCOEFF_NORMED):
+        """
+        Matches every template, resized to (w, h), against the candidate
+
+        return: array (template, y, x) with the response map of each template
+        """
+        return np.stack([cv2.matchTemplate(candidate, self.get_resized(k, w, h), method)
+                         for k in range(len(self.ids))])
+
+    def scores(self, candidate, w, h, method=cv2.TM_CCOEFF_NORMED):
+        # best response of every template
+        responses = self.match(candidate, w, h, method)
+        return responses.reshape(len(self.ids), -1).max(axis=1)
@@ -1,5 +1,8 @@
 import pandas as pd
+import numpy as np
 import os
+import pickle
+from AnnotationStore import load_annotation_store, gt_signature
 
 
 def load_annotations(annot_file):
@@ -19,50 +22,75 @@ def load_annotations(annot_file):
         
     return annotations
 
+def dataset_signature(path_ds_images):
+    # modification times of the image, mask and gt directories, plus the
+    # gt files themselves, which can be edited without touching the directory
+    dirs = tuple(os.stat(os.path.join(path_ds_images, d)).st_mtime for d in ("", "mask", "gt"))
+    return dirs + tuple(gt_signature(os.path.join(path_ds_images, "gt")).tolist())
+
+def list_files(path, prefix, suffix):
+    # stem -> file name of the files of a directory named prefix+stem+suffix
+    files = {}
+    for entry in os.scandir(path):
+        name = entry.name
+        if name.startswith(prefix) and name.endswith(suffix) and entry.is_file():
+            files[name[len(prefix):len(name)-len(suffix)]] = name
+    return files
+
 def create_df_train(path_ds_images):
-    listImages =[]
-    listMask=[]
-    listGT=[]
+    """
+    One row per annotated sign of the training set
 
-    # Import Data from directories
-    for filename in os.listdir(path_ds_images):
-        if filename.endswith(".jpg"):
-            listImages.append(filename)
+    Images (<stem>.jpg), masks (mask/mask.<stem>.png) and annotations
+    (gt/gt.<stem>.txt) are joined by their stem; images missing any of the
+    three files are skipped. The frame is cached in <path>.index.pkl and
+    rebuilt when one of the directories changes.
+    """
+    pathIndex = path_ds_images.rstrip("/")+".index.pkl"
+    signature = dataset_signature(path_ds_images)
+    if os.path.exists(pathIndex):
+        try:
+            with open(pathIndex, "rb") as f:
+                cached = pickle.load(f)
+            if cached["signature"] == signature:
+                return cached["df"]
+        except (IOError, EOFError, KeyError, pickle.UnpicklingError):
+            pass
 
-    for mask in os.listdir(path_ds_images+"/mask/"):
-        listMask.append(mask)
+    # Import Data from directories, one scan each
+    images = list_files(path_ds_images, "", ".jpg")
+    masks = list_files(os.path.join(path_ds_images, "mask"), "mask.", ".png")
+    gts = list_files(os.path.join(path_ds_images, "gt"), "gt.", ".txt")
+    stems = sorted(set(images) & set(masks) & set(gts))
+
+    # annotations are read from the compiled store, not from the text files
+    store = load_annotation_store(path_ds_images+"/gt/")
+    boxes = [store.get_boxes(stem) for stem in stems]
+    codes = [store.codes[slice(*store.index[stem])] for stem in stems]
+    counts = [len(b) for b in boxes]
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4))
 
-    for annot in os.listdir(path_ds_images+"/gt/"):
-        listGT.append(load_annotations(path_ds_images+"/gt/"+annot))
-        
-        
     col = ['UpLeft(Y)','UpLeft(X)','DownRight(Y)','DownRight(X)','Type', "Image", "Mask"]
-    df = pd.DataFrame(columns=col)
-    list=[]
-    image = 0
-    gt= 0
-    dins =0
-    for i in listGT:
-        for j in range(len(listGT[image])):
-            list = listGT[image][dins]
-            list.append(listImages[image])
-            list.append(listMask[image])
-            df.loc[gt] = list
-            dins = dins + 1
-            gt = gt + 1
-        dins = 0
-        del list[:]
-        list = []
-        image = image + 1
+    df = pd.DataFrame({
+        'UpLeft(Y)': boxes[:,0],
+        'UpLeft(X)': boxes[:,1],
+        'DownRight(Y)': boxes[:,2],
+        'DownRight(X)': boxes[:,3],
+        'Type': np.concatenate(codes).tolist() if codes else [],
+        "Image": np.repeat([images[stem] for stem in stems], counts).tolist(),
+        "Mask": np.repeat([masks[stem] for stem in stems], counts).tolist()}, columns=col)
+
+    try:
+        with open(pathIndex, "wb") as f:
+            pickle.dump({"signature": signature, "df": df}, f)
+    except IOError:
+        print("Could not save dataset index", pathIndex)
 
     return df
 
 def create_df_test(path_ds_images):
-    listImages =[]
     # Import Data from directories
-    for filename in os.listdir(path_ds_images):
-        if filename.endswith(".jpg"):
-            listImages.append(filename)
+    listImages = sorted(list_files(path_ds_images, "", ".jpg").values())
      
     col = ["Image"]
     df = pd.DataFrame(columns=col)
@@ -1,15 +1,18 @@
-from ImageFeature import get_ground_truth, save_text_file
+from ImageFeature import get_ground_truth, save_text_file, set_mask_store
+from MaskStore import load_mask_store
 from ImageSplit import split_by_type, compute_stats, plot_stats
 from createDataframe import create_df_train, create_df_test
 from validation import pixel_validation, validation_window
 import numpy as np
 from SlidingWindow import window_main
 from FastSlidingWindow import fast_sw
+from Pipeline import detection_pipeline
 import datetime
 from argparse import ArgumentParser
 #from ColorSegmentation import color_segmentation
 from ColorSegmentationBinary import color_segmentation_binary
 from ColorSegmentationGrey import color_segmentation_grey
+from ColorLUT import hsv_rang
 import pickle
 
 
@@ -61,6 +64,21 @@ typeW = "FAST_PICKEL_MASK"
 # The method to be executed
 task = "SLW_FAST"
 
+# Processes used by the window methods and threads of the pixel validation
+# (None uses every core)
+WORKERS = 1
+# Images sent to a worker at once
+CHUNK_SIZE = 4
+
+# Window tasks run segmentation and window search in memory over the test
+# images instead of reading the masks from resultMask/
+STREAM_PIPELINE = False
+# Folder where the streamed pipeline saves its intermediate masks (None: not saved)
+DEBUG_MASKS_PATH = None
+# Ground truth masks of the train split are read from a bit-packed store
+# (datasets/split/train/mask.bits, built on first use) instead of the pngs
+USE_MASK_STORE = False
+
 if task == "SLW3":
     method = 3
 elif task == "SLW2":
@@ -68,109 +86,114 @@ elif task == "SLW2":
 
 
 #--->  COLOR THRESHOLDS  <----#
-hsv_rang = (
-     np.array([0,150,50]), np.array([20, 255, 255]) #RED
-     ,np.array([160,150,50]), np.array([180, 255, 255]) #DARK RED
-     ,np.array([100,150,50]), np.array([140, 255, 255]) #BLUE
-)
-
-
-###--->  DATA PARSING AND SPLIT  <----#
-if(LOAD_DATA == True):
-# df is created by Parsing training image folders
-    df = create_df_train(fullTrainPath)
-    # df is updated computing provided groundtruth informa2tion
-    df = get_ground_truth(df, fullTrainPath)
-    # df is created with test images
-    dfTest = create_df_test(testPath)
-    # stats are worked out over the df
-    dfStats = compute_stats(df)
-    # ds is splited into two sets (70%, 30%) taking into account signal area size
-    (dfTrain, dfValidation) = split_by_type(df, fullTrainPath)
-
-if(PLOT_STATS == True):
-    plot_stats(df)
-#
-if(USE_TRAIN == True):
-    #--->  TRAIN DATA SEGMENTATION  <----#
-    color_segmentation_binary(dfTest, testPath)
-    pixel_validation(dfTrain, trainSplitPath, 'colorMask')
-    pixel_validation(dfTrain, trainSplitPath, 'morphologyMask')
-    pixel_validation(dfTrain, trainSplitPath, 'finalMask')
+# hsv_rang comes from ColorLUT, shared with the color segmentations
+
+
+# Workers of spawn platforms (Windows, macOS) import this script again, the
+# work only runs when it is executed directly
+if __name__ == '__main__':
+    ###--->  DATA PARSING AND SPLIT  <----#
+    if(LOAD_DATA == True):
+    # df is created by Parsing training image folders
+        df = create_df_train(fullTrainPath)
+        # df is updated computing provided groundtruth informa2tion
+        df = get_ground_truth(df, fullTrainPath, WORKERS, CHUNK_SIZE)
+        # df is created with test images
+        dfTest = create_df_test(testPath)
+        # stats are worked out over the df
+        dfStats = compute_stats(df)
+        # ds is splited into two sets (70%, 30%) taking into account signal area size
+        (dfTrain, dfValidation) = split_by_type(df, fullTrainPath)
+
+    if(PLOT_STATS == True):
+        plot_stats(df)
+    #
+    if(USE_TRAIN == True):
+        #--->  TRAIN DATA SEGMENTATION  <----#
+        color_segmentation_binary(dfTest, testPath)
+        if(USE_MASK_STORE == True):
+            set_mask_store(trainSplitPath+'mask/', load_mask_store(trainSplitPath+'mask/'))
+        pixel_validation(dfTrain, trainSplitPath, ['colorMask', 'morphologyMask', 'finalMask'], WORKERS)
     
-if(USE_VALIDATION == True):
-    #--->  VALIDATION DATA SEGMENTATION  <----#
-    #listOfBB = color_segmentation(dfValidation, validationSplitPath, hsv_rang)
+    if(USE_VALIDATION == True):
+        #--->  VALIDATION DATA SEGMENTATION  <----#
+        #listOfBB = color_segmentation(dfValidation, validationSplitPath, hsv_rang)
     
-    # amb el path, perteixes de gt o de la nostra segmentacio
-    results = "resultMask/finalMask/"
-    #results = "mask/"
+        # amb el path, perteixes de gt o de la nostra segmentacio
+        results = "resultMask/finalMask/"
+        #results = "mask/"
     
-    print ("Start: ", datetime.datetime.now())
-    window_canditate =  window_main(dfValidation, validationSplitPath+results, dfStats, typeW, method)
-    print ("End: ", datetime.datetime.now())
-   # window_canditate =  fast_sw(dfValidation, validationSplitPath, dfStats)
+        print ("Start: ", datetime.datetime.now())
+        window_canditate =  window_main(dfValidation, validationSplitPath+results, dfStats, typeW, method, WORKERS, CHUNK_SIZE)
+        print ("End: ", datetime.datetime.now())
+       # window_canditate =  fast_sw(dfValidation, validationSplitPath, dfStats)
     
-#    pixel_validation(dfTrain, trainSplitPath, 'colorMask')
-#    pixel_validation(dfTrain, trainSplitPath, 'morphologyMask')
-#    pixel_validation(dfTrain, trainSplitPath, 'finalMask')
+    #    pixel_validation(dfTrain, trainSplitPath, 'colorMask')
+    #    pixel_validation(dfTrain, trainSplitPath, 'morphologyMask')
+    #    pixel_validation(dfTrain, trainSplitPath, 'finalMask')
  
     
-    for element in window_canditate:
-        name, positions = element
-        save_text_file(validationSplitPath+"gtResult/", positions, name, method, typeW)
+        for element in window_canditate:
+            name, positions = element
+            save_text_file(validationSplitPath+"gtResult/", positions, name, method, typeW)
     
-    validation_window(dfValidation, validationSplitPath, typeW )
+        validation_window(dfValidation, validationSplitPath, typeW )
  
-if(USE_TEST == True):
+    if(USE_TEST == True):
     
-    path_complete=testPath+"gtResult/"
-    # aixo ha de canviar xk pilli les imatges de test 
-    pathToMask = testPath+"resultMask/"
+        path_complete=testPath+"gtResult/"
+        # aixo ha de canviar xk pilli les imatges de test 
+        pathToMask = testPath+"resultMask/"
     
-    if task == "CCL":    
-        color_segmentation_binary(dfTest, testPath)
-        color_segmentation_grey(dfTest, testPath)
+        if task == "CCL":    
+            color_segmentation_binary(dfTest, testPath)
+            color_segmentation_grey(dfTest, testPath)
 
-    elif task == "SLW2" or task == "SLW3":
+        elif task == "SLW2" or task == "SLW3":
         
-        init = datetime.datetime.now()
+            init = datetime.datetime.now()
         
-        window_canditate =  window_main(dfTest, pathToMask, dfStats, typeW, method)
+            if STREAM_PIPELINE:
+                window_canditate = detection_pipeline(dfTest, testPath, dfStats, task, DEBUG_MASKS_PATH)
+            else:
+                window_canditate =  window_main(dfTest, pathToMask, dfStats, typeW, method, WORKERS, CHUNK_SIZE)
         
-        end = datetime.datetime.now()
-        print ("Total Time: ", end-init)
+            end = datetime.datetime.now()
+            print ("Total Time: ", end-init)
         
-#        # writing text files as result
-#        for element in window_canditate:
-#            name, positions = element
-#            with open(path_complete+'PKL/'+typeW+"/"+name+'.pkl', 'wb') as f:
-#                pickle.dump(positions, f)
-#            
+    #        # writing text files as result
+    #        for element in window_canditate:
+    #            name, positions = element
+    #            with open(path_complete+'PKL/'+typeW+"/"+name+'.pkl', 'wb') as f:
+    #                pickle.dump(positions, f)
+    #            
             
-            #save_text_file(path_complete, positions, name, method, typeW)
+                #save_text_file(path_complete, positions, name, method, typeW)
               
     
-    elif task == "SLW_FAST":
+        elif task == "SLW_FAST":
         
-        init = datetime.datetime.now()
-        window_canditate =  fast_sw(dfTest, testPath, dfStats)
+            init = datetime.datetime.now()
+            if STREAM_PIPELINE:
+                window_canditate = detection_pipeline(dfTest, testPath, dfStats, task, DEBUG_MASKS_PATH)
+            else:
+                window_canditate =  fast_sw(dfTest, testPath, dfStats, WORKERS, CHUNK_SIZE)
         
-        end = datetime.datetime.now()
-        print ("Total Time: ", end-init)
+            end = datetime.datetime.now()
+            print ("Total Time: ", end-init)
         
-        # writing text files as result
-         # writing text files as result
-        for element in window_canditate:
-            name, positions = element
-            with open(path_complete+'PKL/'+typeW+"/"+name+'.pkl', 'wb') as f:
-                pickle.dump(positions, f)
+            # writing text files as result
+             # writing text files as result
+            for element in window_canditate:
+                name, positions = element
+                with open(path_complete+'PKL/'+typeW+"/"+name+'.pkl', 'wb') as f:
+                    pickle.dump(positions, f)
                 
-#        for element in window_canditate:
-#            name, positions = element
-#            save_text_file(testPath, positions, name, method, typeW)
+    #        for element in window_canditate:
+    #            name, positions = element
+    #            save_text_file(testPath, positions, name, method, typeW)
             
         
-    else:
-        print ("Entered method is invalid")
+        else:
+            print ("Entered method is invalid")
     
\ No newline at end of file
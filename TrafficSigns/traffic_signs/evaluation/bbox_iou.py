@@ -1,3 +1,5 @@
+import numpy as np
+
 def bbox_iou(bboxA, bboxB):
     # compute the intersection over union of two bboxes
 
@@ -21,3 +23,94 @@ def bbox_iou(bboxA, bboxB):
     #print (iou)
     # return the intersection over union value
     return iou
+
+
+def bbox_iou_matrix(bboxesA, bboxesB):
+    # intersection over union of every pair of bboxes of two lists, with
+    # the same format and conventions as bbox_iou. Only the first four
+    # values of every bbox are used, so annotations keep their code.
+    # Returns an array of shape (len(bboxesA), len(bboxesB))
+    A = np.array([bbox[:4] for bbox in bboxesA], dtype=float).reshape(-1, 4)
+    B = np.array([bbox[:4] for bbox in bboxesB], dtype=float).reshape(-1, 4)
+
+    # coordinates of the intersection rectangle of every pair
+    xA = np.maximum(A[:, np.newaxis, 1], B[np.newaxis, :, 1])
+    yA = np.maximum(A[:, np.newaxis, 0], B[np.newaxis, :, 0])
+    xB = np.minimum(A[:, np.newaxis, 3], B[np.newaxis, :, 3])
+    yB = np.minimum(A[:, np.newaxis, 2], B[np.newaxis, :, 2])
+
+    interArea = np.maximum(0, xB - xA + 1) * np.maximum(0, yB - yA + 1)
+
+    bboxAArea = (A[:, 2] - A[:, 0] + 1) * (A[:, 3] - A[:, 1] + 1)
+    bboxBArea = (B[:, 2] - B[:, 0] + 1) * (B[:, 3] - B[:, 1] + 1)
+
+    return interArea / (bboxAArea[:, np.newaxis] + bboxBArea[np.newaxis, :] - interArea)
+
+
+def match_iou(iou, threshold=0.5, method='greedy'):
+    # one-to-one matching over an (annotations, detections) IoU matrix,
+    # returns the IoU of every matched pair
+    candidates = iou > threshold
+    if method == 'greedy':
+        (ann, det) = np.nonzero(candidates)
+        order = np.argsort(-iou[ann, det], kind='stable')
+        annotations_used = np.zeros(iou.shape[0], dtype=bool)
+        detections_used = np.zeros(iou.shape[1], dtype=bool)
+        matched = []
+        for ii, jj in zip(ann[order], det[order]):
+            if not annotations_used[ii] and not detections_used[jj]:
+                annotations_used[ii] = True
+                detections_used[jj] = True
+                matched.append(iou[ii, jj])
+        return np.array(matched)
+    elif method == 'hungarian':
+        from scipy.optimize import linear_sum_assignment
+        (ann, det) = linear_sum_assignment(np.where(candidates, -iou, 0))
+        valid = candidates[ann, det]
+        return iou[ann[valid], det[valid]]
+    raise ValueError("Unknown matching method: " + str(method))
+
+
+def match_bboxes(detections, annotations, threshold=0.5, method='greedy',
+                 detectionImages=None, annotationImages=None):
+    # one-to-one matching of detections and annotations whose IoU is above
+    # threshold, computed over the IoU matrix at once
+    #
+    # method: 'greedy'    pairs taken by decreasing IoU
+    #         'hungarian' assignment maximizing the total IoU
+    # detectionImages, annotationImages: optional image name (or id) of every
+    #         detection/annotation, to match a whole dataset in one call.
+    #         Only bboxes of the same image can match, so every image is
+    #         matched over its own IoU block
+    #
+    # Every annotation is counted once: an annotation left unmatched is one FN,
+    # also when its image has no detections at all
+    #
+    # Returns TP, FN, FP and the IoU of every matched pair
+    if method not in ('greedy', 'hungarian'):
+        raise ValueError("Unknown matching method: " + str(method))
+
+    if detectionImages is None or annotationImages is None:
+        matchedIoU = match_iou(bbox_iou_matrix(annotations, detections), threshold, method)
+    else:
+        detectionRows = {}
+        for row, image in enumerate(detectionImages):
+            detectionRows.setdefault(image, []).append(row)
+        annotationRows = {}
+        for row, image in enumerate(annotationImages):
+            annotationRows.setdefault(image, []).append(row)
+
+        matched = [np.zeros(0)]
+        for image, rows in annotationRows.items():
+            if image not in detectionRows:
+                continue
+            iou = bbox_iou_matrix([annotations[i] for i in rows],
+                                  [detections[j] for j in detectionRows[image]])
+            matched.append(match_iou(iou, threshold, method))
+        matchedIoU = np.concatenate(matched)
+
+    TP = len(matchedIoU)
+    FN = len(annotations) - TP
+    FP = len(detections) - TP
+
+    return TP, FN, FP, matchedIoU
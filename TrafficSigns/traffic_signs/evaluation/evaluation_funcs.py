@@ -1,5 +1,5 @@
 import numpy as np
-from evaluation.bbox_iou import bbox_iou
+from evaluation.bbox_iou import match_bboxes
 
 def performance_accumulation_pixel(pixel_candidates, pixel_annotation):
     """ 
@@ -58,18 +58,8 @@ def performance_accumulation_window(detections, annotations):
     False Negative (FN) objects
     """
     
-    detections_used  = np.zeros(len(detections))
-    annotations_used = np.zeros(len(annotations))
-    TP = 0
-    for ii in range (len(annotations)):
-        for jj in range (len(detections)):
-            if (detections_used[jj] == 0) & (bbox_iou(annotations[ii], detections[jj]) > 0.5):
-                TP = TP+1
-                detections_used[jj]  = 1
-                annotations_used[ii] = 1
-
-    FN = np.sum(annotations_used==0)
-    FP = np.sum(detections_used==0)
+    # IoU of every annotation/detection pair at once, one-to-one matching
+    [TP, FN, FP, matchedIoU] = match_bboxes(detections, annotations, 0.5)
 
     return [TP,FN,FP]
 
@@ -1,10 +1,12 @@
 import numpy as np
 from ImageFeature import get_full_mask, get_full_mask_result
 from createDataframe import load_annotations
+from AnnotationStore import load_annotation_store
 from matplotlib import pyplot as plt
 import sys
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, "traffic_signs/evaluation/")
-from bbox_iou import bbox_iou
+from bbox_iou import match_bboxes
 
 
 def performance_accumulation_pixel(pixel_candidates, pixel_annotation):
@@ -26,13 +28,11 @@ def performance_accumulation_pixel(pixel_candidates, pixel_annotation):
     False Negative (pixelFN) and True Negative (pixelTN) pixels in the image pixel_candidates
     """
 
-    pixel_candidates = np.uint64(pixel_candidates>0)
-    pixel_annotation = np.uint64(pixel_annotation>0)
+    # one pass: every pixel falls in bin candidate*2+annotation
+    pixel_candidates = (np.asarray(pixel_candidates)>0).view(np.uint8).ravel()
+    pixel_annotation = (np.asarray(pixel_annotation)>0).view(np.uint8).ravel()
 
-    pixelTP = np.sum(pixel_candidates & pixel_annotation)
-    pixelFP = np.sum(pixel_candidates & (pixel_annotation==0))
-    pixelFN = np.sum((pixel_candidates==0) & pixel_annotation)
-    pixelTN = np.sum((pixel_candidates==0) & (pixel_annotation==0))
+    [pixelTN, pixelFN, pixelFP, pixelTP] = np.bincount(pixel_candidates*np.uint8(2) + pixel_annotation, minlength=4)
 
 
     return (pixelTP, pixelFP, pixelFN, pixelTN)
@@ -93,19 +93,8 @@ def performance_accumulation_window(detections, annotations):
     False Negative (FN) objects
     """
 
-    detections_used  = np.zeros(len(detections))
-    annotations_used = np.zeros(len(annotations))
-    
-    TP = 0
-    for ii in range (len(annotations)):
-        for jj in range (len(detections)):
-            if (detections_used[ii] == 0) & (bbox_iou(annotations[ii], detections[jj]) > 0.5):
-                TP = TP+1
-                detections_used[jj]  = 1
-                annotations_used[ii] = 1
-
-    FN = np.sum(annotations_used==0)
-    FP = np.sum(detections_used==0)
+    # IoU of every annotation/detection pair at once, one-to-one matching
+    [TP, FN, FP, matchedIoU] = match_bboxes(detections, annotations, 0.5)
 
     return [TP,FN,FP]
 
@@ -152,58 +141,87 @@ def compute_f1(precision, recall):
 
     return F1
 
-def pixel_validation(df, pathGT, maskType):
-    TruePos = 0
-    FalsePos = 0
-    FalseNeg = 0
-    TrueNeg = 0
-
-    for i in range(len(df)):
-        dfSingle = df.iloc[i]
-
+def accumulate_image_pixels(dfSingle, pathGT, maskTypes):
+    # [TP, FP, FN, TN] of every mask type of one image, ground truth read once
+    maskValidator = get_full_mask(dfSingle, pathGT)
+    counts = []
+    for maskType in maskTypes:
         maskResult = get_full_mask_result(dfSingle, pathGT, maskType)
-        maskValidator = get_full_mask(dfSingle, pathGT)
+        counts.append(performance_accumulation_pixel(maskResult, maskValidator))
+    return np.array(counts, dtype=np.int64)
 
-        [pixelTP, pixelFP, pixelFN, pixelTN] = performance_accumulation_pixel(maskResult, maskValidator)
-        TruePos += pixelTP
-        FalsePos += pixelFP
-        FalseNeg += pixelFN
-        TrueNeg += pixelTN
+def pixel_validation(df, pathGT, maskType, workers=1):
+    """
+    Pixel evaluation of the result masks of the df against their ground truth
 
-    [pixel_precision, pixel_accuracy, pixel_specificity, pixel_sensitivity, pixel_F1] = performance_evaluation_pixel(TruePos, FalsePos, FalseNeg, TrueNeg)
-    print('RESULTS -> using ',maskType)
-    print('Precission: ', pixel_precision)
-    print('Accuracy: ', pixel_accuracy)
-    print('Specificity: ', pixel_specificity)
-    print('Recall: ', pixel_sensitivity)
-    print('F1: ', pixel_F1)
+    maskType: a mask type ('colorMask', 'morphologyMask', 'finalMask') or a
+              list of them, all evaluated with a single read of each ground truth
+    workers: threads used to load and evaluate the images (1 runs serially,
+             None lets the executor choose), masks are read through the
+             locked image cache so the threads can share it
 
-    return [TruePos, FalsePos, FalseNeg, TrueNeg]
+    return: [TP, FP, FN, TN] for a single mask type, or a dictionary
+            maskType -> [TP, FP, FN, TN] for a list of them
+    """
+    maskTypes = [maskType] if isinstance(maskType, str) else list(maskType)
+    rows = [df.iloc[i] for i in range(len(df))]
+
+    evaluate = lambda dfSingle: accumulate_image_pixels(dfSingle, pathGT, maskTypes)
+    totals = np.zeros((len(maskTypes), 4), dtype=np.int64)
+    if workers == 1:
+        for dfSingle in rows:
+            totals += evaluate(dfSingle)
+    else:
+        # image decoding and counting release the GIL, threads are enough
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for counts in executor.map(evaluate, rows):
+                totals += counts
+
+    results = {}
+    for typeName, [TruePos, FalsePos, FalseNeg, TrueNeg] in zip(maskTypes, totals.tolist()):
+        [pixel_precision, pixel_accuracy, pixel_specificity, pixel_sensitivity, pixel_F1] = performance_evaluation_pixel(TruePos, FalsePos, FalseNeg, TrueNeg)
+        print('RESULTS -> using ',typeName)
+        print('Precission: ', pixel_precision)
+        print('Accuracy: ', pixel_accuracy)
+        print('Specificity: ', pixel_specificity)
+        print('Recall: ', pixel_sensitivity)
+        print('F1: ', pixel_F1)
+        results[typeName] = [TruePos, FalsePos, FalseNeg, TrueNeg]
+
+    if isinstance(maskType, str):
+        return results[maskType]
+    return results
 
 
 def validation_window(df, path, method):
     """
     Compute performance of the model
+
+    Windows and annotations of the whole dataset are matched one to one.
+    Every annotation counts once: unmatched ones are false negatives, also
+    for images where no window was detected. The former per-window loop
+    skipped those images and counted the unmatched annotations of an image
+    once per window, so its recall is not comparable with this one.
     """
     bboxes = read_gt(df, path, method)
 
-    TruePos = 0
-    FalsePos = 0
-    FalseNeg = 0
-
-
-    for i in range(len(bboxes)):
-        name, lista = bboxes[i]
-        for windows in lista:
-            gtFile = "gt."+name+".txt"
-            annotations = load_annotations(path+'gt/'+gtFile)
-            
-            windows = [windows]
-            [pixelTP, pixelFN, pixelFP] = performance_accumulation_window(windows, annotations)
-    
-            TruePos += pixelTP
-            FalsePos += pixelFP
-            FalseNeg += pixelFN
+    # every window and annotation of the dataset, labelled with its image
+    detections = []
+    detectionImages = []
+    annotations = []
+    annotationImages = []
+    store = load_annotation_store(path+'gt/')
+    for name, lista in bboxes:
+        imageAnnotations = store.get_boxes(name)
+        detections.extend(lista)
+        detectionImages.extend([name]*len(lista))
+        annotations.extend(imageAnnotations)
+        annotationImages.extend([name]*len(imageAnnotations))
+
+    # whole dataset matched in one call, one IoU block per image
+    [TruePos, FalseNeg, FalsePos, matchedIoU] = match_bboxes(detections, annotations, 0.5,
+                                                            detectionImages=detectionImages,
+                                                            annotationImages=annotationImages)
             
     [precision, sensitivity, accuracy] = performance_evaluation_window(TruePos, FalsePos, FalseNeg)
     
@@ -0,0 +1,160 @@
+import os
+import hashlib
+import pickle
+import numpy as np
+from utils import create_dir
+
+def file_hash(pathFile):
+    # md5 of the file content
+    with open(pathFile, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+class DescriptorIndex(object):
+    """
+    Descriptors of the database images stored on disk
+
+    path/descriptors.f32  float32 matrix (images, descriptor length), read
+                          with a memory map
+    path/index.pkl        names and content hashes of the rows, plus the
+                          metadata of the descriptors (color space, level,
+                          bins, preprocessing)
+
+    An index is only reused when its metadata equals the requested one, and
+    rows are recomputed only for images whose content hash changed.
+    """
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = dict(metadata)
+        self.names = []
+        self.hashes = []
+        self.rows = {}
+        self.descriptors = np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def open(cls, path, metadata):
+        # index saved in path, or an empty one if it does not exist or was
+        # built with other metadata
+        index = cls(path, metadata)
+        pathIndex = os.path.join(path, "index.pkl")
+        if not os.path.exists(pathIndex):
+            return index
+        with open(pathIndex, "rb") as f:
+            saved = pickle.load(f)
+        if saved["metadata"] != index.metadata:
+            return index
+
+        pathMatrix = os.path.join(path, "descriptors.f32")
+        if not os.path.exists(pathMatrix) or os.path.getsize(pathMatrix) != len(saved["names"])*saved["length"]*4:
+            # matrix and table out of sync (interrupted save), rebuild
+            return index
+
+        index.names = saved["names"]
+        index.hashes = saved["hashes"]
+        index.rows = dict((name, row) for row, name in enumerate(index.names))
+        if index.names:
+            index.descriptors = np.memmap(pathMatrix, dtype=np.float32, mode="r",
+                                          shape=(len(index.names), saved["length"]))
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def add(self, name, hashValue, descriptor):
+        # adds or replaces the descriptor of one image
+        descriptor = np.asarray(descriptor, dtype=np.float32).reshape(1, -1)
+        if len(self.names) and descriptor.shape[1] != self.descriptors.shape[1]:
+            raise ValueError("Descriptor of "+name+" has length "+str(descriptor.shape[1])
+                             +", the index uses "+str(self.descriptors.shape[1]))
+        if name in self.rows:
+            descriptors = np.array(self.descriptors)
+            descriptors[self.rows[name]] = descriptor
+            self.descriptors = descriptors
+            self.hashes[self.rows[name]] = hashValue
+        else:
+            self.rows[name] = len(self.names)
+            self.names.append(name)
+            self.hashes.append(hashValue)
+            self.descriptors = np.concatenate((self.descriptors.reshape(-1, descriptor.shape[1]), descriptor))
+
+    def remove(self, names):
+        # drops the rows of the given images
+        names = set(names)
+        keep = [row for row, name in enumerate(self.names) if name not in names]
+        self.descriptors = np.array(self.descriptors[keep])
+        self.names = [self.names[row] for row in keep]
+        self.hashes = [self.hashes[row] for row in keep]
+        self.rows = dict((name, row) for row, name in enumerate(self.names))
+
+    def update(self, pathImages, names, descriptorFunc):
+        """
+        Brings the index up to date with the images names of pathImages
+
+        descriptorFunc(pathImage) computes the descriptor of one image, it is
+        called only for new images and images whose content changed. Images
+        of the index that are not in names are removed.
+
+        return: number of descriptors computed
+        """
+        names = list(names)
+        present = set(names)
+        removed = [name for name in self.names if name not in present]
+        if removed:
+            self.remove(removed)
+
+        changed = []
+        for name in names:
+            hashValue = file_hash(os.path.join(pathImages, name))
+            if name not in self.rows or self.hashes[self.rows[name]] != hashValue:
+                changed.append((name, hashValue))
+
+        # the matrix is copied once for all the edited images and new rows
+        # are stacked once instead of growing the matrix per image
+        editedRows = []
+        editedDescriptors = []
+        newNames = []
+        newRows = []
+        for name, hashValue in changed:
+            descriptor = np.asarray(descriptorFunc(os.path.join(pathImages, name)), dtype=np.float32).reshape(-1)
+            if name in self.rows:
+                self.hashes[self.rows[name]] = hashValue
+                editedRows.append(self.rows[name])
+                editedDescriptors.append(descriptor)
+            else:
+                newNames.append((name, hashValue))
+                newRows.append(descriptor)
+        if editedRows:
+            descriptors = np.array(self.descriptors)
+            descriptors[editedRows] = np.stack(editedDescriptors)
+            self.descriptors = descriptors
+        if newRows:
+            length = newRows[0].shape[0]
+            self.descriptors = np.concatenate((np.asarray(self.descriptors).reshape(-1, length), np.stack(newRows)))
+            for name, hashValue in newNames:
+                self.rows[name] = len(self.names)
+                self.names.append(name)
+                self.hashes.append(hashValue)
+
+        if changed or removed:
+            self.save()
+        return len(changed)
+
+    def save(self):
+        # writes the matrix and then the table, if a crash leaves them out of
+        # sync open() finds a matrix of the wrong size and starts over
+        create_dir(self.path)
+        length = self.descriptors.shape[1] if len(self.names) else 0
+        pathMatrix = os.path.join(self.path, "descriptors.f32")
+        np.ascontiguousarray(self.descriptors, dtype=np.float32).tofile(pathMatrix+".tmp")
+        os.replace(pathMatrix+".tmp", pathMatrix)
+        with open(os.path.join(self.path, "index.pkl"), "wb") as f:
+            pickle.dump({"metadata": self.metadata, "names": self.names, "hashes": self.hashes,
+                         "length": length}, f)
+        if len(self.names):
+            self.descriptors = np.memmap(pathMatrix, dtype=np.float32, mode="r", shape=(len(self.names), length))
+
+    def get(self, names):
+        # descriptors of the given images, one row per name in that order
+        return self.descriptors[[self.rows[name] for name in names]]
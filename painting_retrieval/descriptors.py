@@ -0,0 +1,74 @@
+import numpy as np
+
+def regions_per_level(level):
+    # number of regions of a level of segmentation
+    return (2**level)**2
+
+class Descriptors(object):
+    """
+    Histogram descriptors of a set of images in one contiguous array
+
+    data: float32 array (image, region, channel, bin)
+    names: image name of every row
+    levels: levels of segmentation stored along the region axis, one after
+            the other (a single level by default), regions of every level
+            numbered column by column as in task1.pyramid_histogram
+    channels: name of every channel, ex: "LUV"
+
+    Axes are named by AXES, flat gives the (image, region*channel*bin)
+    feature matrix used by the distance functions without copying.
+    """
+    AXES = ('image', 'region', 'channel', 'bin')
+
+    def __init__(self, data, names, levels=(0,), channels="012"):
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        if data.ndim != 4:
+            raise ValueError("Descriptors need an (image, region, channel, bin) array")
+        self.levels = tuple(levels)
+        nRegions = sum(regions_per_level(l) for l in self.levels)
+        if data.shape[1] != nRegions:
+            raise ValueError("Levels "+str(self.levels)+" have "+str(nRegions)+" regions, the array has "+str(data.shape[1]))
+        self.data = data
+        self.names = list(names)
+        self.channels = list(channels)
+
+    @classmethod
+    def from_flat(cls, matrix, names, levels=(0,), channels="012"):
+        # wraps an (image, features) matrix in (region, channel, bin) order,
+        # without copying it when it is already float32 and contiguous
+        matrix = np.asarray(matrix)
+        nRegions = sum(regions_per_level(l) for l in levels)
+        return cls(matrix.reshape(len(matrix), nRegions, len(channels), -1), names, levels, channels)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def bins(self):
+        return self.data.shape[3]
+
+    @property
+    def flat(self):
+        # (image, features) view of data
+        return self.data.reshape(len(self), -1)
+
+    def level(self, level):
+        # (image, region, channel, bin) view of the regions of one level
+        start = 0
+        for l in self.levels:
+            stop = start + regions_per_level(l)
+            if l == level:
+                return self.data[:, start:stop]
+            start = stop
+        raise ValueError("Level "+str(level)+" is not stored, levels: "+str(self.levels))
+
+    def channel(self, channel):
+        # (image, region, bin) view of one channel, by name or position
+        if not isinstance(channel, int):
+            channel = self.channels.index(channel)
+        return self.data[:, :, channel]
+
+    def select(self, names):
+        # descriptors of the given images, in that order
+        rows = dict((name, row) for row, name in enumerate(self.names))
+        return Descriptors(self.data[[rows[name] for name in names]], names, self.levels, self.channels)
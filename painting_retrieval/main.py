@@ -1,9 +1,11 @@
 import cv2
 from utils import create_df, get_full_image, save_pkl, mapk, create_dir, get_query_gt
-from method1 import store_histogram_total, histograms_to_list
+from method1 import image_descriptor
+from descriptor_index import DescriptorIndex
+from descriptors import Descriptors
 from task5 import texture_method1
-from global_color_histograms import global_color_hist,save_global_color_hist, global_color
-from task3 import getHellingerKernelResult, getHistInterseccionResult, getX2results
+from global_color_histograms import global_color_hist,save_global_color_hist
+from task3 import rank_results
 
 # Paths
 pathDS = "dataset/"
@@ -16,6 +18,7 @@ pathResultsM1 = "results/method1/"
 pathResultsM2 = "results/method2/"
 pathResultsM3 = "results/method3/"
 pathQueriesTest = "queries_test/"
+pathIndex = "results/descriptor_index/"
 
 # Crear directorios
 create_dir(pathprep_resultDS)
@@ -47,6 +50,15 @@ elif(method == 2):
     spaceType= "LUV"
     level=2
 
+# pyramid levels in the descriptors and their weights (None: all 1), ex:
+# pyramidLevels = (0, 1, 2) with pyramidWeights = task1.pyramid_weights(2)
+pyramidLevels = (level,) if method != 3 else None
+pyramidWeights = None
+
+# what the descriptors of the index were built with
+descriptorMetadata = {"spaceType": spaceType, "level": level, "bins": 256, "prepoces": prepoces,
+                      "levels": pyramidLevels, "weights": pyramidWeights} if method != 3 else None
+
 dfDataset = create_df(pathDS)
 dfQuery = create_df(pathQueries)
 dfQueryTest = create_df(pathQueriesTest)
@@ -61,64 +73,45 @@ if global_color_histograms==True:
 
 
 if build_dataset==True:
-    # Read Images
-    for index, row in dfDataset.iterrows():
-        imageName = row["Image"]
-        imgBGR = cv2.imread(pathDS+imageName,1)
-        if prepoces==True:
-            global_color(imgBGR, spaceType, pathprep_resultDS, imageName, True)
-        else:
-            global_color(imgBGR, spaceType, pathprep_resultDS, imageName, False)
-
-    store_histogram_total(dfDataset, pathprep_resultDS+"Final/", spaceType, level=level)
+    if(method == 1 or method == 2):
+        # Descriptors are computed in memory and stored in the index, only
+        # for images that are new or changed since the last build
+        index = DescriptorIndex.open(pathIndex, descriptorMetadata)
+        computed = index.update(pathDS, dfDataset["Image"].tolist(),
+                                lambda pathImage: image_descriptor(cv2.imread(pathImage,1), spaceType, level, prepoces, pyramidLevels, pyramidWeights))
+        print("Descriptors computed:", computed, "of", len(index))
 
 if pass_queries == True:
-    X2resultList = []
-    HIresultList = []
-    HKresultList = []
     # Create list of lists for all histograms in the query test/evaluation
     if(performEvaluation == 1):
-        if(method == 1 or method == 2):
-            for index, row in dfQuery.iterrows():
-                queryImage = row["Image"]
-                imgBGR = cv2.imread(pathQueries+queryImage,1)
-                if prepoces==True:
-                    global_color(imgBGR, spaceType, pathprep_resultQueries, queryImage, True)    
-                else:
-                    global_color(imgBGR, spaceType, pathprep_resultQueries, queryImage, False)
-
-            store_histogram_total(dfQuery, pathprep_resultQueries+"Final/", spaceType, level=level)	
-            whole_query_list = [histograms_to_list(row_ds, level, spaceType) for _,row_ds in dfQuery.iterrows() ]
-        elif(method ==3):
-            whole_query_list = texture_method1(dfQuery, pathQueries)       
-    
+        dfQueries, pathQueriesUsed = dfQuery, pathQueries
     elif(performTest == 1):
-        if(method == 1 or method == 2):
-            for index, row in dfQueryTest.iterrows():
-                queryImage = row["Image"]
-                imgBGR = cv2.imread(pathQueriesTest+queryImage,1)
-                if prepoces==True:
-                    global_color(imgBGR, spaceType, pathprep_resultQueries, queryImage, True)    
-                else:
-                    global_color(imgBGR, spaceType, pathprep_resultQueries, queryImage, False)
+        dfQueries, pathQueriesUsed = dfQueryTest, pathQueriesTest
 
-            store_histogram_total(dfQueryTest, pathprep_resultQueries+"Final/", spaceType, level=level)	
-            whole_query_list = [histograms_to_list(row_ds, level, spaceType) for _,row_ds in dfQueryTest.iterrows() ]
-        elif(method ==3):
-            whole_query_list = texture_method1(dfQueryTest, pathQueriesTest)
+    if(method == 1 or method == 2):
+        queryDescriptors = Descriptors.from_flat([image_descriptor(cv2.imread(pathQueriesUsed+queryImage,1), spaceType, level, prepoces,
+                                                                   pyramidLevels, pyramidWeights)
+                                                  for queryImage in dfQueries["Image"]],
+                                                 dfQueries["Image"].tolist(), pyramidLevels, spaceType)
+        whole_query_list = queryDescriptors.flat
+    elif(method ==3):
+        whole_query_list = texture_method1(dfQueries, pathQueriesUsed)
             
     # Create list of lists for all histograms in the dataset
     if(method == 1 or method == 2):         
-        whole_hist_list = [histograms_to_list(row_ds, level, spaceType) for _,row_ds in dfDataset.iterrows() ]
+        # only the index is loaded, rows in dfDataset order
+        index = DescriptorIndex.open(pathIndex, descriptorMetadata)
+        datasetDescriptors = Descriptors.from_flat(index.get(dfDataset["Image"].tolist()),
+                                                   dfDataset["Image"].tolist(), pyramidLevels, spaceType)
+        whole_hist_list = datasetDescriptors.flat
     elif(method ==3):
         whole_hist_list = texture_method1(dfDataset, pathDS)
 
-    for query in whole_query_list:
-        histogram_query = query
-
-        X2resultList.append(getX2results(whole_hist_list, histogram_query,  k, dfDataset))
-        HIresultList.append(getHistInterseccionResult(whole_hist_list, histogram_query,  k, dfDataset))
-        HKresultList.append(getHellingerKernelResult(whole_hist_list, histogram_query,  k, dfDataset))
+    # every query ranked with the three metrics in one sweep of the dataset
+    rankings = rank_results(whole_query_list, whole_hist_list, k, dfDataset, ('x2', 'intersection', 'hellinger'))
+    X2resultList = rankings['x2']
+    HIresultList = rankings['intersection']
+    HKresultList = rankings['hellinger']
 
     if(performEvaluation == 1):
         # Load provided GT
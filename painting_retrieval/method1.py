@@ -1,62 +1,27 @@
-from task1 import get_image, compute_histogram, histogram_region
+from task1 import pyramid_descriptor
+from global_color_histograms import changeSpaceColor, equalyse_luminance_image, low_filter_unsharp, white_balance_LAB
 
 
-def store_histogram_total(df, path,channel_name, level=0):
+def image_descriptor(imgBGR, spaceType, level, prepoces=False, levels=None, weights=None):
     """
-    Method to store histograms into the dataframe
-
-    df: dataframe with image names
-
-    channel_name: by default it is set to RGB
+    Descriptor of an image computed in memory, without the color converted
+    copy written to and read back from disk
 
+    imgBGR: image as read by cv2.imread
+    spaceType: color space, as in global_color (ex: "LUV")
     level: level of segmentation in the image
+    prepoces: applies the preprocessing chain of preproces_image first
+    levels, weights: pyramid levels (default only level) and their weights,
+                     see pyramid_descriptor. Every level comes from the same
+                     pass over the pixels
 
-    To access histogram:
-    IMAGE | LEVEL0_R | LEVEL0_G | LEVEL0_B | LEVEL1_R | LEVEL1_G | LEVEL1_B |...
-
-    ex:
-    - LEVEL0: df["level0_B"].iloc[i][0] will return the histogram values (only one) for image i
-    - LEVEL1: df["level1_B"].iloc[i][0..3] each index returns the hist values for the region for image i
-    - LEVELN: df["levelN_B"].iloc[i][0..2**N]
-
-    Order of the histograms:
-    It follows columns ordering. Example for a level2 image:
-    |0|4|08|12|
-    |1|5|09|13|
-    |2|6|10|14|
-    |3|7|11|15|
-
+    return: float32 array with the histograms in (region, channel, bin)
+    order, the layout of Descriptors.flat
     """
-    channel_name = list(channel_name)
-
-    channels = range(len(channel_name))
-
-    hists= [[histogram_region(get_image(row[0][:], path), c, level) \
-             for c in channels ] for index,row in df.iterrows()]
-
-    df['level' + str(level) + "_" + channel_name[0]] = [item[0] for item in hists]
-    df['level' + str(level) + "_" + channel_name[1]] = [item[1] for item in hists]
-    df['level' + str(level) + "_" + channel_name[2]] = [item[2] for item in hists]
-
-    return hists
-
-def histograms_to_list(df_row, level, channel_name):
-    rf=[]
-    bf=[]
-    gf=[]
-    channel_name = list(channel_name)
-    #print (channel_name)
-    R = 'level' + str(level) + "_"+channel_name[2]
-    G = 'level' + str(level) + "_"+channel_name[1]
-    B = 'level' + str(level) + "_"+channel_name[0]
-
-    r = df_row[R]
-    g = df_row[G]
-    b = df_row[B]
-
-    for i in range(len(r)):
-        rf.extend([item[0] for item in r[i].tolist()])
-        gf.extend([item[0] for item in g[i].tolist()])
-        bf.extend([item[0] for item in b[i].tolist()])
+    if prepoces == True:
+        imgBGR = white_balance_LAB(low_filter_unsharp(equalyse_luminance_image(imgBGR, "HSV")), "LAB")
+    im = changeSpaceColor(imgBGR, spaceType)
 
-    return rf+gf+bf
+    if levels is None:
+        levels = (level,)
+    return pyramid_descriptor(im, levels, weights).reshape(-1)
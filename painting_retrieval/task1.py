@@ -29,45 +29,81 @@ def compute_histogram(im, channel, mask=None,bins=256):
 #    cv2.normalize(hist,hist,8,cv2.NORM_MINMAX)
     return hist
 
-def histogram_region(im, channel, level):
+def divide_image(im, div):
     """
-    im: imagey
-    level: level of segmentation
-    channel: 0,1,2
-
-    return: list of histograms from the different image regions
-    hist_channel = [ [hist_region1], [hist_region2],.., [hist_regionN] ]
+    im: image
+    div: number of regions per absis
 
+    return: list of [y1, x1, y2, x2] from the different image regions
     """
-    div = 2**level
-
     w, h = im.shape[1] , im.shape[0]
 
     w_step = int(w/div)
     h_step = int(h/div)
 
-    return [compute_histogram(im[y:y+h_step,x:x+w_step], channel) \
+    return [[y,x,y+h_step,x+w_step] \
     for x in range(0,w,w_step) \
         if x+w_step <= w \
     for y in range(0,h,h_step) \
         if y+h_step<= h]
 
 
-
-def divide_image(im, div):
+def pyramid_histogram(im, level, bins=256):
     """
-    im: image
-    div: number of regions per absis
-
-    return: list of [y1, x1, y2, x2] from the different image regions
+    Region histograms of every level 0..level of an image
+
+    Only the regions of the finest level are read from the pixels, one
+    calcHist per region and channel. Every coarser level is the sum of its
+    four children, so it covers the area of the finest grid (the whole image
+    when its size is divisible by 2**level).
+
+    return: list with one array (regions, channels, bins) per level, regions
+    numbered column by column, ex: level 2
+    |0|4|08|12|
+    |1|5|09|13|
+    |2|6|10|14|
+    |3|7|11|15|
     """
-    w, h = im.shape[1] , im.shape[0]
+    if im.ndim == 2:
+        im = im[:, :, np.newaxis]
+    channels = im.shape[2]
+    div = 2**level
+    w_step = int(im.shape[1]/div)
+    h_step = int(im.shape[0]/div)
+
+    # (x, y, channel, bin), regions numbered column by column
+    finest = np.empty((div, div, channels, bins), dtype=np.float32)
+    for x in range(div):
+        for y in range(div):
+            region = im[y*h_step:(y+1)*h_step, x*w_step:(x+1)*w_step]
+            for c in range(channels):
+                finest[x, y, c] = cv2.calcHist([region], [c], None, [bins], [0, 256]).ravel()
+
+    levels = []
+    for l in range(level+1):
+        n = 2**l
+        f = div//n
+        # (x, child x, y, child y, channel, bin) summed over the children
+        hist = finest.reshape(n, f, n, f, channels, bins).sum(axis=(1, 3))
+        levels.append(hist.reshape(n*n, channels, bins))
+    return levels
+
+def pyramid_weights(level):
+    # spatial pyramid matching weights: 1/2**level for level 0 and
+    # 1/2**(level-l+1) for every other level l
+    return [1/2**level] + [1/2**(level-l+1) for l in range(1, level+1)]
+
+def pyramid_descriptor(im, levels, weights=None, bins=256):
+    """
+    Weighted histograms of several pyramid levels of an image
 
-    w_step = int(w/div)
-    h_step = int(h/div)
+    levels: levels included, ex: (0, 1, 2), all from one pass over the pixels
+    weights: weight of every level in levels, default 1
 
-    return [[y,x,y+h_step,x+w_step] \
-    for x in range(0,w,w_step) \
-        if x+w_step <= w \
-    for y in range(0,h,h_step) \
-        if y+h_step<= h]
+    return: float32 array (regions of every level, channels, bins)
+    """
+    levels = list(levels)
+    if weights is None:
+        weights = [1]*len(levels)
+    pyramid = pyramid_histogram(im, max(levels), bins)
+    return np.concatenate([pyramid[l]*np.float32(weight) for l, weight in zip(levels, weights)])
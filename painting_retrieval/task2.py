@@ -1,28 +1,92 @@
-import numpy as np 
+import numpy as np
+
+# Every metric works on a pair of histograms (1D) or on stacked histograms,
+# one per row, and reduces over the last axis
 
 ##METHOD x2Distance
 def x2Distance(histTarget, histSource):
-    diference = 0.0
-    for i in range(len(histSource)):
-        uperDiv = (histSource[i]-histTarget[i])**2  + 1
-        lowerDiv = histSource[i]+histTarget[i] + 1
-
-        division = np.divide(uperDiv,lowerDiv)
-        diference = diference + division
-    
-    return diference
+    histTarget = np.asarray(histTarget, dtype=float)
+    histSource = np.asarray(histSource, dtype=float)
+    uperDiv = (histSource-histTarget)**2 + 1
+    lowerDiv = histSource+histTarget + 1
+    return np.sum(uperDiv/lowerDiv, axis=-1)
 
 
 ##METHOD Histogram Intersection
 def histIntersection(histTarget, histSource):
-    intesection =0.0
-    for i in range(len(histSource)):
-        intesection = intesection + min(histSource[i],histTarget[i])
-    return intesection
+    return np.sum(np.minimum(np.asarray(histSource, dtype=float), np.asarray(histTarget, dtype=float)), axis=-1)
 
 ##METHOD Hellinger Kernel
 def hellingerKernel(histTarget, histSource):
-    similarity =0.0
-    for i in range(len(histSource)):
-        similarity = similarity + np.sqrt(histSource[i]*histTarget[i])
-    return similarity
+    return np.sum(np.sqrt(np.asarray(histSource, dtype=float)*np.asarray(histTarget, dtype=float)), axis=-1)
+
+##METHOD L1 distance
+def l1Distance(histTarget, histSource):
+    return np.sum(np.abs(np.asarray(histSource, dtype=float)-np.asarray(histTarget, dtype=float)), axis=-1)
+
+##METHOD Bhattacharyya distance, as cv2.HISTCMP_BHATTACHARYYA
+def bhattacharyyaDistance(histTarget, histSource):
+    histTarget = np.asarray(histTarget, dtype=float)
+    histSource = np.asarray(histSource, dtype=float)
+    n = histSource.shape[-1]
+    norm = np.sqrt(histSource.mean(axis=-1)*histTarget.mean(axis=-1))*n
+    coefficient = hellingerKernel(histTarget, histSource)/np.where(norm > 0, norm, 1)
+    return np.sqrt(np.maximum(1 - coefficient, 0))
+
+##METHOD Earth mover's distance between 1D histograms of histSize bins
+def emdDistance(histTarget, histSource, histSize=256):
+    # descriptors are concatenated histograms, the distance is the sum of the
+    # EMD of every histogram, each one normalized to sum 1
+    histTarget = np.asarray(histTarget, dtype=float)
+    histSource = np.asarray(histSource, dtype=float)
+    if histSource.shape[-1] % histSize != 0:
+        histSize = histSource.shape[-1]
+
+    def cumulative(hist):
+        hist = hist.reshape(hist.shape[:-1]+(-1, histSize))
+        total = hist.sum(axis=-1, keepdims=True)
+        return np.cumsum(hist/np.where(total > 0, total, 1), axis=-1)
+
+    return np.sum(np.abs(cumulative(histSource)-cumulative(histTarget)), axis=(-2, -1))
+
+
+# name -> (metric, True when bigger values mean more similar images)
+METRICS = {
+    'x2': (x2Distance, False),
+    'intersection': (histIntersection, True),
+    'hellinger': (hellingerKernel, True),
+    'l1': (l1Distance, False),
+    'bhattacharyya': (bhattacharyyaDistance, False),
+    'emd': (emdDistance, False),
+}
+
+def distance_matrix(queries, dataset, metric='x2', maxElements=2**24):
+    """
+    Metric between every query and every dataset descriptor
+
+    queries: array (q, d), one descriptor per row
+    dataset: array (n, d)
+    metric: name of METRICS
+    maxElements: bound of the (queries, dataset, d) block evaluated at once
+
+    return: array (q, n)
+    """
+    queries = np.asarray(queries, dtype=float).reshape(-1, np.shape(dataset)[-1])
+    dataset = np.asarray(dataset, dtype=float)
+    function = METRICS[metric][0]
+
+    if metric == 'hellinger':
+        # a matrix product, no need to broadcast
+        return np.sqrt(queries) @ np.sqrt(dataset).T
+
+    result = np.empty((len(queries), len(dataset)))
+    d = max(dataset.shape[1], 1)
+    queryChunk = max(1, min(len(queries), maxElements//(d*max(len(dataset), 1))))
+    datasetChunk = max(1, min(len(dataset), maxElements//(d*queryChunk)))
+    for q in range(0, len(queries), queryChunk):
+        blockQ = queries[q:q+queryChunk, np.newaxis, :]
+        for n in range(0, len(dataset), datasetChunk):
+            blockD = dataset[np.newaxis, n:n+datasetChunk, :]
+            result[q:q+queryChunk, n:n+datasetChunk] = function(blockD, blockQ)
+
+    return result
@@ -1,52 +1,59 @@
-from task2 import  hellingerKernel, histIntersection, x2Distance
-import operator
-import task2
+from task2 import METRICS, distance_matrix
 import numpy as np
 
 
+def top_k(scores, K, isSimilarity):
+    """
+    Positions of the K best scores of every row, best first
+
+    scores: array (q, n)
+    return: array (q, min(K, n)), ties keep the dataset order
+    """
+    K = min(K, scores.shape[1])
+    if K == 0:
+        return np.zeros((scores.shape[0], 0), dtype=int)
+    keys = -scores if isSimilarity else scores
+    # every image scoring at least as well as the K-th one, ties at the
+    # boundary included, then only those are sorted
+    best = np.empty((len(keys), K), dtype=int)
+    for q in range(len(keys)):
+        kth = np.partition(keys[q], K-1)[K-1]
+        candidates = np.flatnonzero(keys[q] <= kth)
+        order = np.argsort(keys[q, candidates], kind='stable')
+        best[q] = candidates[order[:K]]
+    return best
+
+def rank_results(histogram_list_queries, histogram_list_dataset, K, dfDataset,
+                 metrics=('x2', 'intersection', 'hellinger'), maxElements=2**24):
+    """
+    K most similar dataset images of every query for several metrics
+
+    The dataset descriptors are swept once, keeping their dtype (float32
+    descriptors are not copied): every chunk of images is scored with all the
+    metrics before moving to the next one. Chunks hold at most maxElements
+    (query, image, bin) values.
+
+    return: dictionary metric -> list (one per query) of lists of K image names
+    """
+    dataset = np.asarray(histogram_list_dataset)
+    queries = np.asarray(histogram_list_queries).reshape(-1, dataset.shape[1])
+    names = dfDataset['Image'].to_numpy()
+
+    scores = dict((metric, np.empty((len(queries), len(dataset)))) for metric in metrics)
+    chunkSize = max(1, maxElements//max(len(queries)*dataset.shape[1], 1))
+    for start in range(0, len(dataset), chunkSize):
+        block = dataset[start:start+chunkSize]
+        for metric in metrics:
+            scores[metric][:, start:start+chunkSize] = distance_matrix(queries, block, metric, maxElements)
+
+    return dict((metric, names[top_k(scores[metric], K, METRICS[metric][1])].tolist()) for metric in metrics)
+
+
 def getX2results(histogram_list_dataset, histogram_query, K, dfDataset):
-    
-    dictList = {}
-    counter = 0
-    for histogram_dataset in histogram_list_dataset: 
-        
-        name = dfDataset['Image'].iloc[counter]
-        counter+=1
-        distance = x2Distance(histogram_dataset, histogram_query)
-        dictList[name] = distance
-
-    pairedList = sorted(dictList.items(), key = operator.itemgetter(1))
-    distanceList = list(zip(*pairedList))[0]
-    distanceList =  distanceList[:K]
-    
-    return list(distanceList)
-        
+    return rank_results([histogram_query], histogram_list_dataset, K, dfDataset, ('x2',))['x2'][0]
+
 def getHellingerKernelResult(histogram_list_dataset, histogram_query, K, dfDataset):
-    dictList = {}
-    counter = 0
-    for histogram_dataset in histogram_list_dataset: 
-        
-        name = dfDataset['Image'].iloc[counter]
-        counter+=1
-        distance = hellingerKernel(histogram_dataset, histogram_query)
-        dictList[name] = distance
-
-    pairedList = sorted(dictList.items(), key = operator.itemgetter(1), reverse = True)
-    simlarityList = list(zip(*pairedList))[0]
-    simlarityList =  simlarityList[:K]
-    return list(simlarityList)
+    return rank_results([histogram_query], histogram_list_dataset, K, dfDataset, ('hellinger',))['hellinger'][0]
 
 def getHistInterseccionResult(histogram_list_dataset, histogram_query, K, dfDataset):
-    dictList = {}
-    counter = 0
-    for histogram_dataset in histogram_list_dataset: 
-        
-        name = dfDataset['Image'].iloc[counter]
-        counter+=1
-        distance = histIntersection(histogram_dataset, histogram_query)
-        dictList[name] = distance
-
-    pairedList = sorted(dictList.items(), key = operator.itemgetter(1), reverse = True)
-    intersectionList = list(zip(*pairedList))[0]
-    intersectionList =  intersectionList[:K]
-    return list(intersectionList)
+    return rank_results([histogram_query], histogram_list_dataset, K, dfDataset, ('intersection',))['intersection'][0]